@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+from sklearn.base import clone
+
+from parallel import worker_data, worker_pool
+
+
+def bootstrap_counts(seed, n, sample_size):
+    """How often each of the n rows is drawn in one bootstrap sample"""
+    rng = np.random.default_rng(seed)
+    return np.bincount(rng.integers(0, n, size=sample_size), minlength=n)
+
+
+def _fit_member(seed):
+    data = worker_data
+    X, y = data['X'], data['y']
+    counts = bootstrap_counts(seed, len(X), data['sample_size'])
+    member = clone(data['estimator'])
+    # Weighting rows by how often they were drawn trains on the bootstrap
+    # sample without copying the rows into a new array
+    member.fit(X, y, sample_weight=counts)
+    return member
+
+
+class BaggingEnsemble:
+    """Bagging of any estimator whose fit accepts sample_weight.
+
+    Every member is trained on a bootstrap sample of sample_size rows
+    (default: all rows) drawn with replacement. Members are trained in a
+    process pool and vote by majority, computed for all samples at once.
+    """
+
+    def __init__(self, estimator, n_estimators=100, sample_size=None,
+                 n_jobs=None, random_state=None):
+        self.estimator = estimator
+        self.n_estimators = n_estimators
+        self.sample_size = sample_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        self.classes_, y = np.unique(np.asarray(y), return_inverse=True)
+        sample_size = self.sample_size or len(X)
+        self.seeds_ = np.random.SeedSequence(self.random_state).spawn(
+            self.n_estimators)
+        self.n_samples_ = len(X)
+        self.sample_size_ = sample_size
+
+        n_jobs = self.n_jobs or os.cpu_count() or 1
+        chunksize = max(1, self.n_estimators // (4 * n_jobs))
+        with worker_pool(n_jobs, dict(estimator=self.estimator, X=X, y=y,
+                                      sample_size=sample_size)) as pool:
+            self.estimators_ = list(pool.map(_fit_member, self.seeds_,
+                                             chunksize=chunksize))
+        return self
+
+    def bootstrap_indices(self, i):
+        """Row indices (with repeats) of member i's bootstrap sample"""
+        counts = bootstrap_counts(self.seeds_[i], self.n_samples_,
+                                  self.sample_size_)
+        return np.repeat(np.arange(self.n_samples_), counts)
+
+    def member_votes(self, X):
+        """Class index predicted by every member, shape (members, samples)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return np.stack([member.predict(X).astype(np.intp)
+                         for member in self.estimators_])
+
+    def member_predictions(self, X):
+        """Labels predicted by every member, shape (members, samples)"""
+        return self.classes_[self.member_votes(X)]
+
+    def vote_counts(self, X):
+        """Votes per class for every sample, shape (samples, classes)"""
+        votes = self.member_votes(X)
+        n_samples, n_classes = votes.shape[1], len(self.classes_)
+        # Offset every sample's votes so one bincount counts them all
+        flat = votes + n_classes * np.arange(n_samples)
+        counts = np.bincount(flat.ravel(), minlength=n_samples * n_classes)
+        return counts.reshape(n_samples, n_classes)
+
+    def predict(self, X):
+        return self.classes_[self.vote_counts(X).argmax(axis=1)]
+
+    def predict_proba(self, X):
+        return self.vote_counts(X) / len(self.estimators_)
+
+    def score(self, X, y):
+        return np.mean(self.predict(X) == np.asarray(y))
@@ -0,0 +1,141 @@
+import csv
+import hashlib
+import os
+
+import numpy as np
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+CACHE_DIR = '.csv_cache'
+# Bump when the sidecar layout changes so old sidecars are re-parsed
+CACHE_VERSION = 1
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def sniff(path):
+    """Return (encoding, delimiter, has_header) of a CSV file"""
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    encoding = 'utf-8-sig' if head.startswith(b'\xef\xbb\xbf') else 'utf-8'
+    text = head.decode(encoding, errors='ignore')
+    lines = text.splitlines()[:2]
+    try:
+        delimiter = csv.Sniffer().sniff(lines[0], delimiters=',;\t').delimiter
+    except (csv.Error, IndexError):
+        delimiter = ','
+    rows = list(csv.reader(lines, delimiter=delimiter))
+    # A header has a text field where the first data row has a number
+    has_header = len(rows) == 2 and any(
+        not is_number(name) and is_number(value)
+        for name, value in zip(rows[0], rows[1]))
+    if len(rows) == 1:
+        has_header = not all(is_number(value) for value in rows[0])
+    return encoding, delimiter, has_header
+
+
+def is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_csv(path, encoding, delimiter, has_header):
+    """Parse a CSV file into column names and one typed array per column.
+
+    Numeric columns become int64 or float64 arrays, everything else a
+    unicode string array. Uses pandas' C parser when it is installed.
+    """
+    header = 0 if has_header else None
+    if pd is not None:
+        frame = pd.read_csv(path, sep=delimiter, header=header,
+                            encoding=encoding)
+        names = [str(name) for name in frame.columns]
+        columns = [frame[name].to_numpy() for name in frame.columns]
+    else:
+        with open(path, newline='', encoding=encoding) as f:
+            rows = [row for row in csv.reader(f, delimiter=delimiter) if row]
+        names = rows.pop(0) if has_header else list(range(len(rows[0])))
+        names = [str(name) for name in names]
+        columns = list(zip(*rows))
+    return names, [typed_column(column) for column in columns]
+
+
+def typed_column(values):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iuf':
+        return values
+    for dtype in (np.int64, np.float64):
+        try:
+            return values.astype(dtype)
+        except ValueError:
+            pass
+    return values.astype(str)
+
+
+def sidecar_path(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR, name + '.npz')
+
+
+def read_sidecar(path, stat):
+    """Columns from a sidecar that still matches the CSV, otherwise None"""
+    cache_path = sidecar_path(path)
+    if not os.path.exists(cache_path):
+        return None
+    with np.load(cache_path, allow_pickle=False) as cached:
+        if int(cached['version']) != CACHE_VERSION:
+            return None
+        same_file = (int(cached['size']) == stat.st_size
+                     and int(cached['mtime_ns']) == stat.st_mtime_ns)
+        # A touched but unchanged file still hits the cache
+        if not same_file and str(cached['sha256']) != file_digest(path):
+            return None
+        names = [str(name) for name in cached['names']]
+        return names, [cached[f'column{i}'] for i in range(len(names))]
+
+
+def write_sidecar(path, stat, names, columns):
+    cache_path = sidecar_path(path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    arrays = {f'column{i}': column for i, column in enumerate(columns)}
+    tmp_path = cache_path + '.tmp.npz'
+    np.savez(tmp_path, version=CACHE_VERSION, size=stat.st_size,
+             mtime_ns=stat.st_mtime_ns, sha256=file_digest(path),
+             names=np.array(names, dtype=str), **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def load_columns(path, cache=True):
+    """Load a CSV file as (column names, list of typed column arrays).
+
+    The delimiter (, ; or tab), a UTF-8 BOM and a header row are detected
+    automatically. The parsed columns are cached in a .npz sidecar keyed
+    by the file's size, mtime and SHA-256, so later loads skip parsing.
+    """
+    stat = os.stat(path)
+    if cache:
+        cached = read_sidecar(path, stat)
+        if cached is not None:
+            return cached
+    names, columns = parse_csv(path, *sniff(path))
+    if cache:
+        write_sidecar(path, stat, names, columns)
+    return names, columns
+
+
+def load_matrix(path, dtype=np.float64, cache=True):
+    """Load an all-numeric CSV file as one 2-D array"""
+    names, columns = load_columns(path, cache)
+    return np.column_stack(columns).astype(dtype, copy=False)
@@ -0,0 +1,106 @@
+import numpy as np
+
+
+def model_labels(models, points, batch_size=50000):
+    """Labels of every model for every point, shape (models, points).
+
+    Points are evaluated in batches, one decision_function call per model
+    and batch where available.
+    """
+    labels = np.empty((len(models), len(points)), dtype=np.intp)
+    for start in range(0, len(points), batch_size):
+        batch = points[start:start + batch_size]
+        for m, model in enumerate(models):
+            labels[m, start:start + batch_size] = _labels(model, batch)
+    return labels
+
+
+def _labels(model, points):
+    if not hasattr(model, 'decision_function'):
+        return np.searchsorted(model.classes_, model.predict(points))
+    scores = model.decision_function(points)
+    if scores.ndim == 1:
+        return (scores > 0).astype(np.intp)
+    return scores.argmax(axis=1)
+
+
+def adaptive_grid(models, x_range, y_range, step, coarse_step=16):
+    """Class index of every model on a regular grid, found adaptively.
+
+    The grid is first evaluated every coarse_step points. Only cells whose
+    corners disagree (for any model) are split in four and evaluated at
+    the finer level, so the number of predictions grows with the length
+    of the decision boundaries instead of the plot area.
+    Returns xx, yy like np.meshgrid and Z of shape (models, rows, cols).
+    """
+    xs = np.arange(x_range[0], x_range[1], step)
+    ys = np.arange(y_range[0], y_range[1], step)
+    stride = 1 << max(0, int(coarse_step).bit_length() - 1)
+    # Pad so the grid is a whole number of coarse cells
+    n_rows = -(-(len(ys) - 1) // stride) * stride + 1
+    n_cols = -(-(len(xs) - 1) // stride) * stride + 1
+    grid_x = x_range[0] + step * np.arange(n_cols)
+    grid_y = y_range[0] + step * np.arange(n_rows)
+
+    Z = np.full((len(models), n_rows, n_cols), -1, dtype=np.intp)
+
+    def evaluate(rows, cols):
+        # Only points not known yet, each evaluated once
+        flat = np.unique(rows * n_cols + cols)
+        flat = flat[Z[0].ravel()[flat] < 0]
+        if len(flat) == 0:
+            return
+        rows, cols = np.divmod(flat, n_cols)
+        points = np.column_stack([grid_x[cols], grid_y[rows]])
+        Z[:, rows, cols] = model_labels(models, points)
+
+    cell_rows, cell_cols = np.meshgrid(np.arange((n_rows - 1) // stride),
+                                       np.arange((n_cols - 1) // stride),
+                                       indexing='ij')
+    cell_rows, cell_cols = cell_rows.ravel(), cell_cols.ravel()
+    corners = [(0, 0), (0, 1), (1, 0), (1, 1)]
+    while True:
+        evaluate(np.concatenate([(cell_rows + dr) * stride
+                                 for dr, _ in corners]),
+                 np.concatenate([(cell_cols + dc) * stride
+                                 for _, dc in corners]))
+        values = np.stack([Z[:, (cell_rows + dr) * stride,
+                             (cell_cols + dc) * stride]
+                           for dr, dc in corners])
+        uniform = (values == values[0]).all(axis=(0, 1))
+
+        # Fill uniform cells with their corner label
+        shape = ((n_rows - 1) // stride, (n_cols - 1) // stride)
+        cell_labels = np.full((len(models),) + shape, -1, dtype=np.intp)
+        cell_labels[:, cell_rows[uniform], cell_cols[uniform]] = \
+            values[0][:, uniform]
+        row_cells = np.minimum(np.arange(n_rows) // stride, shape[0] - 1)
+        col_cells = np.minimum(np.arange(n_cols) // stride, shape[1] - 1)
+        filled = cell_labels[:, row_cells][:, :, col_cells]
+        Z = np.where(Z < 0, filled, Z)
+
+        if stride == 1:
+            break
+        # Split the mixed cells into four cells of half the size
+        cell_rows = cell_rows[~uniform] * 2
+        cell_cols = cell_cols[~uniform] * 2
+        cell_rows = np.concatenate([cell_rows + dr for dr, _ in corners])
+        cell_cols = np.concatenate([cell_cols + dc for _, dc in corners])
+        stride //= 2
+
+    # Points left unknown at the edges of mixed cells
+    rows, cols = np.nonzero(Z[0] < 0)
+    evaluate(rows, cols)
+
+    Z = Z[:, :len(ys), :len(xs)]
+    xx, yy = np.meshgrid(xs, ys)
+    return xx, yy, Z
+
+
+def plot_decision_boundaries(axes, models, x_range, y_range, step, cmap,
+                             coarse_step=16):
+    """Draw every model's decision regions on its own axis"""
+    xx, yy, Z = adaptive_grid(models, x_range, y_range, step, coarse_step)
+    for ax, regions in zip(axes, Z):
+        ax.pcolormesh(xx, yy, regions, cmap=cmap)
+    return xx, yy, Z
@@ -0,0 +1,126 @@
+import numpy as np
+
+
+def encode_labels(y_true, predictions, classes=None):
+    """Class indices of the true labels and of every prediction"""
+    y_true = np.asarray(y_true)
+    predictions = np.asarray(predictions)
+    if classes is None:
+        classes = np.unique(np.concatenate([y_true.ravel(),
+                                            predictions.ravel()]))
+    classes = np.asarray(classes)
+    return (classes, np.searchsorted(classes, y_true),
+            np.searchsorted(classes, predictions))
+
+
+def confusion_matrices(y_true, predictions, classes=None):
+    """Confusion matrices of many models in one bincount.
+
+    predictions has one row per model, shape (models, samples), and the
+    result has shape (models, classes, classes) with true labels on the
+    rows. A single prediction vector gives a single matrix.
+    """
+    classes, true, predicted = encode_labels(y_true, predictions, classes)
+    k = len(classes)
+    stacked = np.atleast_2d(predicted)
+    cells = (np.arange(len(stacked))[:, None] * k * k + true * k + stacked)
+    counts = np.bincount(cells.ravel(), minlength=len(stacked) * k * k)
+    counts = counts.reshape(len(stacked), k, k)
+    return counts if predicted.ndim > 1 else counts[0]
+
+
+def accuracies(confusion):
+    """Accuracy of every confusion matrix in a stack"""
+    confusion = np.asarray(confusion)
+    correct = np.trace(confusion, axis1=-2, axis2=-1)
+    return correct / confusion.sum(axis=(-2, -1))
+
+
+def model_accuracies(y_true, predictions):
+    """Accuracy of every row of predictions, shape (models,)"""
+    return np.mean(np.atleast_2d(predictions) == np.asarray(y_true), axis=1)
+
+
+def class_metrics(confusion):
+    """Precision, recall, F1 and support per class, for one or many
+    confusion matrices. Classes that are never predicted (or never
+    present) get 0 instead of a division warning.
+    """
+    confusion = np.asarray(confusion, dtype=np.float64)
+    correct = np.diagonal(confusion, axis1=-2, axis2=-1)
+    support = confusion.sum(axis=-1)
+    predicted = confusion.sum(axis=-2)
+    precision = np.divide(correct, predicted, out=np.zeros_like(correct),
+                          where=predicted > 0)
+    recall = np.divide(correct, support, out=np.zeros_like(correct),
+                       where=support > 0)
+    total = precision + recall
+    f1 = np.divide(2 * precision * recall, total,
+                   out=np.zeros_like(correct), where=total > 0)
+    return {'precision': precision, 'recall': recall, 'f1': f1,
+            'support': support.astype(np.int64)}
+
+
+def row_percentages(confusion):
+    """Every cell as a fraction of its row, i.e. of the true class"""
+    confusion = np.asarray(confusion)
+    totals = confusion.sum(axis=-1, keepdims=True)
+    return np.divide(confusion, totals, out=np.zeros(confusion.shape),
+                     where=totals > 0)
+
+
+def annotate_confusion(ax, confusion, threshold, color, light_color='white'):
+    """Write "count (percentage)" in every cell of a confusion heatmap.
+
+    Cells above threshold (fraction of the row) get light_color text.
+    """
+    percentages = row_percentages(confusion)
+    for (i, j), count in np.ndenumerate(confusion):
+        percentage = percentages[i, j]
+        ax.text(j + 0.5, i + 0.5, f'{count}\n({percentage:.1%})',
+                ha='center', va='center', fontsize=10,
+                color=light_color if percentage > threshold else color)
+
+
+class ErrorIndex:
+    """Indices of the samples in every (true, predicted) cell.
+
+    The samples are sorted by cell once, so the indices of a cell are a
+    view of that order and nothing is copied from the data itself; index
+    the data with them only for the samples that are actually used.
+    """
+
+    def __init__(self, y_true, y_pred, classes=None):
+        self.classes_, true, predicted = encode_labels(y_true, y_pred,
+                                                       classes)
+        k = len(self.classes_)
+        cells = true * k + predicted
+        self.order_ = np.argsort(cells, kind='stable')
+        counts = np.bincount(cells, minlength=k * k)
+        self.offsets_ = np.concatenate([[0], np.cumsum(counts)])
+        self.confusion_ = counts.reshape(k, k)
+
+    def cell(self, true, predicted):
+        """Indices of samples of class true predicted as predicted (view)"""
+        k = len(self.classes_)
+        c = (np.searchsorted(self.classes_, true) * k
+             + np.searchsorted(self.classes_, predicted))
+        return self.order_[self.offsets_[c]:self.offsets_[c + 1]]
+
+    def misclassified(self, true=None, predicted=None):
+        """Indices of misclassified samples, optionally only those whose
+        true and/or predicted label is in the given classes. A single
+        cell is returned as a view, several cells are concatenated.
+        """
+        true = self.classes_ if true is None else np.atleast_1d(true)
+        predicted = (self.classes_ if predicted is None
+                     else np.atleast_1d(predicted))
+        cells = [self.cell(t, p) for t in true for p in predicted
+                 if t != p and self.confusion_[
+                     np.searchsorted(self.classes_, t),
+                     np.searchsorted(self.classes_, p)]]
+        if len(cells) == 1:
+            return cells[0]
+        if not cells:
+            return self.order_[:0]
+        return np.sort(np.concatenate(cells))
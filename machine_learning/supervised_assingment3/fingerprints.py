@@ -0,0 +1,24 @@
+import hashlib
+import json
+
+import numpy as np
+
+
+def data_fingerprint(*arrays, chunk_rows=10000):
+    """SHA-256 of the arrays, read in chunks so memory maps stay on disk"""
+    sha = hashlib.sha256()
+    for array in arrays:
+        if array is None:
+            sha.update(b'None')
+            continue
+        array = np.asarray(array)
+        sha.update(f'{array.shape}{array.dtype.str}'.encode())
+        for start in range(0, len(array), chunk_rows):
+            sha.update(np.ascontiguousarray(
+                array[start:start + chunk_rows]).tobytes())
+    return sha.hexdigest()
+
+
+def params_json(params):
+    """Parameters as canonical JSON, values JSON cannot store as repr"""
+    return json.dumps(params, sort_keys=True, default=repr)
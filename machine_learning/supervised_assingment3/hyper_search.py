@@ -0,0 +1,292 @@
+import hashlib
+import json
+import math
+import os
+import pickle
+from concurrent.futures import as_completed
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import KFold, ParameterGrid, StratifiedKFold
+
+from fingerprints import data_fingerprint, params_json
+from parallel import attach_array, share_array, worker_data, worker_pool
+
+
+def _attach_search_data(data):
+    X, X_block = attach_array(data['X'])
+    y, y_block = attach_array(data['y'])
+    # Keep the blocks referenced for as long as the worker lives
+    return {**data, 'X': X, 'y': y, 'blocks': (X_block, y_block)}
+
+
+def _evaluate(params, train, test, keep_model):
+    data = worker_data
+    X, y = data['X'], data['y']
+    model = clone(data['estimator']).set_params(**params)
+    model.fit(X[train], y[train])
+    if data['scoring'] is None:
+        score = model.score(X[test], y[test])
+    else:
+        score = data['scoring'](model, X[test], y[test])
+    return float(score), model if keep_model else None
+
+
+class ResultCache:
+    """Fold scores on disk, one JSON object per line.
+
+    Every result is appended as soon as it is known, so an interrupted
+    search resumes where it stopped. Models trained at the full budget
+    are pickled next to it so the winner never has to be refit.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, 'results.jsonl')
+        self.model_dir = os.path.join(directory, 'models')
+        os.makedirs(self.model_dir, exist_ok=True)
+        self.scores = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line of an interrupted write
+                        continue
+                    self.scores[entry['key']] = entry['score']
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def get(self, key):
+        return self.scores.get(key)
+
+    def put(self, key, score, model=None):
+        if model is not None:
+            with open(self._model_path(key), 'wb') as f:
+                pickle.dump(model, f)
+        self.scores[key] = score
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'key': key, 'score': score}) + '\n')
+
+    def model(self, key):
+        path = self._model_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def _model_path(self, key):
+        return os.path.join(self.model_dir, key + '.pkl')
+
+
+class SuccessiveHalving:
+    """Successive halving over training set size.
+
+    All candidates are cross-validated on min_budget samples, the best
+    1/eta of them go on to eta times as many samples, and so on until
+    max_budget (default: all samples). Folds run in a process pool of
+    n_jobs workers. With a cache_dir, fold scores are kept on disk keyed
+    by dataset hash, estimator, parameters, budget and fold, so repeated
+    or interrupted searches only compute what is missing.
+
+    best_estimator_ is the best fold model of the winner at the full
+    budget, trained on (cv - 1) / cv of the data, instead of a refit.
+    """
+
+    def __init__(self, estimator, param_grid, min_budget=None,
+                 max_budget=None, eta=3, cv=5, n_jobs=None, scoring=None,
+                 cache_dir=None, random_state=0, verbose=1):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.eta = eta
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.scoring = scoring
+        self.cache_dir = cache_dir
+        self.random_state = random_state
+        self.verbose = verbose
+
+    def candidates(self):
+        if isinstance(self.param_grid, (dict, ParameterGrid)):
+            return list(ParameterGrid(self.param_grid))
+        return list(self.param_grid)
+
+    def fit(self, X, y):
+        self._start(X, y)
+        try:
+            self._run_bracket(self.candidates(), self._rungs())
+        finally:
+            self._stop()
+        return self
+
+    # Number of rungs below the full budget
+    def _rungs(self):
+        if self.min_budget is not None:
+            min_budget = self.min_budget
+        else:
+            # Enough rungs that about one candidate reaches the full budget
+            rungs = math.ceil(math.log(len(self.candidates()), self.eta))
+            min_budget = max(self.max_budget_ // self.eta ** rungs,
+                             2 * self.cv)
+        return max(0, int(math.log(self.max_budget_ / min_budget, self.eta)
+                          + 1e-9))
+
+    def _start(self, X, y):
+        self.X_, self.y_ = X, np.asarray(y)
+        self.max_budget_ = min(self.max_budget or len(X), len(X))
+        # One fixed shuffle, every budget is a prefix of it so smaller
+        # budgets are subsets of larger ones
+        rng = np.random.default_rng(self.random_state)
+        self.order_ = rng.permutation(len(X))
+        self.cache_ = (ResultCache(self.cache_dir)
+                       if self.cache_dir is not None else None)
+        self.data_hash_ = (data_fingerprint(X, y)
+                           if self.cache_ is not None else None)
+        self.results_ = []
+        self.best_score_ = -np.inf
+        self.best_params_ = None
+        self.best_estimator_ = None
+
+        n_jobs = self.n_jobs or os.cpu_count() or 1
+        data = dict(estimator=self.estimator, X=X, y=self.y_,
+                    scoring=self.scoring)
+        setup, self.blocks_ = None, []
+        if n_jobs > 1:
+            # Workers map a memory mapped X from its file, anything else
+            # is copied once into shared memory, instead of every worker
+            # unpickling its own copy
+            setup = _attach_search_data
+            for name, array in (('X', np.asarray(X)), ('y', self.y_)):
+                data[name], block = share_array(array, array.dtype)
+                self.blocks_.append(block)
+        self.pool_ = worker_pool(n_jobs, data, setup)
+
+    def _stop(self):
+        self.pool_.shutdown()
+        for block in self.blocks_:
+            if block is not None:
+                block.close()
+                block.unlink()
+        del self.X_, self.y_, self.blocks_
+
+    # Budgets are max_budget / eta ** rung, so brackets share rungs and
+    # therefore cache entries
+    def _run_bracket(self, candidates, rungs):
+        while True:
+            budget = self.max_budget_ // self.eta ** rungs
+            final = rungs == 0
+            scores, models = self._evaluate_rung(candidates, budget, final)
+            if final:
+                break
+            keep = max(1, len(candidates) // self.eta)
+            ranking = np.argsort(scores)[::-1][:keep]
+            candidates = [candidates[i] for i in ranking]
+            # A lone survivor goes straight to the full budget
+            rungs = 0 if keep == 1 else rungs - 1
+
+        best = int(np.argmax(scores))
+        if final and scores[best] > self.best_score_:
+            self.best_score_ = scores[best]
+            self.best_params_ = candidates[best]
+            self.best_estimator_ = models[best]
+        return candidates[best], scores[best]
+
+    def _evaluate_rung(self, candidates, budget, final):
+        rows = self.order_[:budget]
+        _, class_counts = np.unique(self.y_[rows], return_counts=True)
+        splitter = (StratifiedKFold(self.cv) if class_counts.min() >= self.cv
+                    else KFold(self.cv))
+        folds = list(splitter.split(rows, self.y_[rows]))
+        fold_scores = np.full((len(candidates), self.cv), np.nan)
+        fold_models = {}
+        futures = {}
+        for c, params in enumerate(candidates):
+            for f, (train, test) in enumerate(folds):
+                key = self._key(params, budget, f)
+                cached = self.cache_.get(key) if self.cache_ else None
+                if cached is not None:
+                    fold_scores[c, f] = cached
+                    continue
+                future = self.pool_.submit(_evaluate, params, rows[train],
+                                           rows[test], final)
+                futures[future] = (c, f, key)
+        for future in as_completed(futures):
+            self._store(fold_scores, fold_models, *futures[future],
+                        *future.result())
+
+        scores = fold_scores.mean(axis=1)
+        models = [self._best_fold_model(c, params, budget, rows, folds,
+                                        fold_scores, fold_models)
+                  if final else None
+                  for c, params in enumerate(candidates)]
+        for params, score, folds_ in zip(candidates, scores, fold_scores):
+            self.results_.append({'params': params, 'budget': budget,
+                                  'mean_score': float(score),
+                                  'fold_scores': folds_.tolist()})
+            if self.verbose:
+                print(f'budget={budget} score={score:.4f} {params}')
+        return scores, models
+
+    def _store(self, fold_scores, fold_models, c, f, key, score, model):
+        fold_scores[c, f] = score
+        if model is not None:
+            fold_models[c, f] = model
+        if self.cache_ is not None:
+            self.cache_.put(key, score, model)
+
+    # Model of the candidate's best fold, from this run or the cache. A
+    # cached score whose model pickle is gone is refit.
+    def _best_fold_model(self, c, params, budget, rows, folds, fold_scores,
+                         fold_models):
+        f = int(np.argmax(fold_scores[c]))
+        if (c, f) in fold_models:
+            return fold_models[c, f]
+        key = self._key(params, budget, f)
+        model = self.cache_.model(key) if self.cache_ is not None else None
+        if model is None:
+            train, test = folds[f]
+            score, model = self.pool_.submit(
+                _evaluate, params, rows[train], rows[test], True).result()
+            self._store(fold_scores, fold_models, c, f, key, score, model)
+        return model
+
+    def _key(self, params, budget, fold):
+        if self.cache_ is None:
+            return None
+        return ResultCache.key(self.data_hash_, type(self.estimator).__name__,
+                               params_json(self.estimator.get_params()),
+                               params_json(params), budget, fold, self.cv,
+                               self.random_state)
+
+
+class Hyperband(SuccessiveHalving):
+    """Hyperband: several successive halving brackets that trade the number
+    of candidates against the starting budget. Candidates are sampled from
+    param_grid for every bracket; the cache makes repeats free.
+    """
+
+    def fit(self, X, y):
+        self._start(X, y)
+        try:
+            candidates = self.candidates()
+            rng = np.random.default_rng(self.random_state)
+            min_budget = self.min_budget or max(2 * self.cv,
+                                                self.max_budget_ // 81)
+            brackets = int(math.log(self.max_budget_ / min_budget,
+                                    self.eta) + 1e-9)
+            for s in range(brackets, -1, -1):
+                n = math.ceil((brackets + 1) / (s + 1) * self.eta ** s)
+                n = min(n, len(candidates))
+                picked = rng.choice(len(candidates), n, replace=False)
+                if self.verbose:
+                    print(f'Bracket {s}: {n} candidates from '
+                          f'{self.max_budget_ // self.eta ** s} samples')
+                self._run_bracket([candidates[i] for i in picked], s)
+        finally:
+            self._stop()
+        return self
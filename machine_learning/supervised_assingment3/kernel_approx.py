@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import SGDClassifier
+from sklearn.svm import SVC
+
+from mnist_reader import iter_chunks
+
+FEATURE_MAPS = {'rff': RBFSampler, 'nystroem': Nystroem}
+
+
+class ApproximateKernelSVM:
+    """RBF SVM trained in the primal on an approximate kernel feature map.
+
+    The RBF kernel is approximated with random Fourier features ('rff') or
+    Nystroem ('nystroem') of n_components dimensions, and a linear SVM
+    (hinge loss SGD) is trained on minibatches that are mapped on the fly,
+    so the mapped feature matrix never has to fit in memory. Training time
+    grows linearly with the number of samples instead of quadratically.
+    C and gamma mean the same as for SVC.
+    """
+
+    def __init__(self, method='rff', n_components=2000, gamma='scale', C=1.0,
+                 epochs=5, batch_size=2000, random_state=0):
+        self.method = method
+        self.n_components = n_components
+        self.gamma = gamma
+        self.C = C
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.random_state = random_state
+
+    def _gamma(self, X):
+        if self.gamma != 'scale':
+            return self.gamma
+        # Same default as SVC, estimated from a sample of the rows
+        sample = np.asarray(X[:10000], dtype=np.float64)
+        return 1 / (X.shape[1] * sample.var())
+
+    def fit(self, X, y):
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        rng = np.random.default_rng(self.random_state)
+        self.feature_map_ = FEATURE_MAPS[self.method](
+            gamma=self._gamma(X), n_components=self.n_components,
+            random_state=self.random_state)
+        # Nystroem picks its landmarks from the rows it is fitted on
+        sample = np.sort(rng.choice(len(X), min(len(X), 10000),
+                                    replace=False))
+        self.feature_map_.fit(np.asarray(X[sample], dtype=np.float32))
+
+        # alpha is the SGD regularization matching SVC's C
+        self.linear_ = SGDClassifier(loss='hinge', alpha=1 / (self.C * len(X)),
+                                     random_state=self.random_state)
+        for _ in range(self.epochs):
+            order = rng.permutation(len(X))
+            for rows in iter_chunks(order, chunk_size=self.batch_size):
+                rows = np.sort(rows)
+                self.linear_.partial_fit(self.transform(X[rows]), y[rows],
+                                         classes=self.classes_)
+        return self
+
+    def transform(self, X):
+        return self.feature_map_.transform(np.asarray(X, dtype=np.float32))
+
+    def decision_function(self, X):
+        return np.concatenate([
+            self.linear_.decision_function(self.transform(chunk))
+            for chunk in iter_chunks(X, chunk_size=self.batch_size)])
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            return self.classes_[(scores > 0).astype(int)]
+        return self.classes_[scores.argmax(axis=1)]
+
+    def score(self, X, y):
+        return np.mean(self.predict(X) == np.asarray(y))
+
+
+def make_svm(mode, C, gamma, **kwargs):
+    """Exact SVC for mode 'exact', otherwise an ApproximateKernelSVM"""
+    if mode == 'exact':
+        return SVC(kernel='rbf', C=C, gamma=gamma)
+    return ApproximateKernelSVM(method=mode, C=C, gamma=gamma, **kwargs)
+
+
+def compare_kernel_svms(X, y, X_test, y_test, C, gamma,
+                        modes=('exact', 'rff', 'nystroem'), **kwargs):
+    """Train every mode on the same data, returns accuracy and timings"""
+    results = []
+    for mode in modes:
+        model = make_svm(mode, C, gamma, **kwargs)
+        start = time.perf_counter()
+        model.fit(X, y)
+        fit_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        accuracy = np.mean(model.predict(X_test) == np.asarray(y_test))
+        predict_seconds = time.perf_counter() - start
+        results.append({'mode': mode, 'accuracy': accuracy,
+                        'fit_seconds': fit_seconds,
+                        'predict_seconds': predict_seconds})
+    return results
+
+
+def print_comparison(results):
+    print(f"{'Mode':<10}{'Accuracy':>10}{'Fit s':>10}{'Predict s':>12}")
+    for row in results:
+        print(f"{row['mode']:<10}{row['accuracy'] * 100:>9.2f}%"
+              f"{row['fit_seconds']:>10.2f}{row['predict_seconds']:>12.2f}")
@@ -1,22 +1,97 @@
-def load_mnist(path, kind='train'):
-    import os
-    import gzip
-    import numpy as np
-
-    """Load MNIST data from `path`"""
-    labels_path = os.path.join(path,
-                               '%s-labels-idx1-ubyte.gz'
-                               % kind)
-    images_path = os.path.join(path,
-                               '%s-images-idx3-ubyte.gz'
-                               % kind)
-
-    with gzip.open(labels_path, 'rb') as lbpath:
-        labels = np.frombuffer(lbpath.read(), dtype=np.uint8,
-                               offset=8)
-
-    with gzip.open(images_path, 'rb') as imgpath:
-        images = np.frombuffer(imgpath.read(), dtype=np.uint8,
-                               offset=16).reshape(len(labels), 784)
-
-    return images, labels
+import gzip
+import os
+import shutil
+from functools import reduce
+
+import numpy as np
+
+# IDX type codes (third byte of the magic number), all stored big-endian
+IDX_DTYPES = {
+    0x08: np.dtype('u1'),
+    0x09: np.dtype('i1'),
+    0x0B: np.dtype('>i2'),
+    0x0C: np.dtype('>i4'),
+    0x0D: np.dtype('>f4'),
+    0x0E: np.dtype('>f8'),
+}
+
+# File names used by the original gzipped release and by the Kaggle copy
+IDX_NAMES = ['{kind}-{what}-idx{dims}-ubyte.gz',
+             '{kind}-{what}-idx{dims}-ubyte',
+             '{kind}-{what}.idx{dims}-ubyte']
+
+
+def read_idx_header(f):
+    """Read an IDX header, returns (dtype, shape, header size in bytes)"""
+    magic = f.read(4)
+    if len(magic) != 4 or magic[0] != 0 or magic[1] != 0:
+        raise ValueError('Not an IDX file')
+    if magic[2] not in IDX_DTYPES:
+        raise ValueError(f'Unknown IDX data type 0x{magic[2]:02x}')
+    dims = magic[3]
+    shape = tuple(int(d) for d in np.frombuffer(f.read(4 * dims), '>u4'))
+    return IDX_DTYPES[magic[2]], shape, 4 + 4 * dims
+
+
+def decompressed_path(path, cache_dir=None):
+    """Decompress a .gz file once and return the path of the raw copy.
+
+    The copy is streamed to disk in blocks, so files bigger than memory
+    work, and it is only rewritten when the .gz file is newer.
+    """
+    if not path.endswith('.gz'):
+        return path
+    raw_path = path[:-3]
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        raw_path = os.path.join(cache_dir, os.path.basename(raw_path))
+    if (not os.path.exists(raw_path)
+            or os.path.getmtime(raw_path) < os.path.getmtime(path)):
+        tmp_path = raw_path + '.tmp'
+        with gzip.open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp_path, raw_path)
+    return raw_path
+
+
+def open_idx(path, cache_dir=None):
+    """Memory-map an IDX file (optionally gzipped) as a read-only array"""
+    path = decompressed_path(path, cache_dir)
+    with open(path, 'rb') as f:
+        dtype, shape, offset = read_idx_header(f)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def find_idx_file(path, kind, what, dims):
+    for name in IDX_NAMES:
+        candidate = os.path.join(path, name.format(kind=kind, what=what,
+                                                   dims=dims))
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f'No {kind} {what} IDX file in {path}')
+
+
+def load_mnist(path, kind='train', cache_dir=None):
+    """Load MNIST data from `path`
+
+    Images come back as an (n, pixels) view of a memory-mapped file, so
+    nothing is read until it is used.
+    """
+    labels = open_idx(find_idx_file(path, kind, 'labels', 1), cache_dir)
+    images = open_idx(find_idx_file(path, kind, 'images', 3), cache_dir)
+    if len(images) != len(labels):
+        raise ValueError(f'{len(images)} images but {len(labels)} labels')
+    pixels = reduce(lambda a, b: a * b, images.shape[1:], 1)
+    return images.reshape(len(images), pixels), labels
+
+
+def iter_chunks(*arrays, chunk_size=10000):
+    """Yield aligned slices of at most chunk_size rows from each array.
+
+    Slices of a memory map are views, so only the chunk being used has
+    to fit in memory.
+    """
+    n = len(arrays[0])
+    for start in range(0, n, chunk_size):
+        chunk = tuple(array[start:start + chunk_size] for array in arrays)
+        yield chunk if len(chunk) > 1 else chunk[0]
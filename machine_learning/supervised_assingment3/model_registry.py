@@ -0,0 +1,191 @@
+import hashlib
+import inspect
+import json
+import math
+import numbers
+import os
+import time
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.base import clone
+
+from fingerprints import data_fingerprint, params_json
+
+
+# Parameters that do not change the fitted model
+IGNORED_PARAMS = ('n_jobs', 'verbose')
+
+
+def estimator_params(estimator):
+    """Constructor parameters of an estimator, nested estimators as repr"""
+    if hasattr(estimator, 'get_params'):
+        params = estimator.get_params(deep=False)
+    else:
+        # Plain classes like BaggingEnsemble keep their arguments as
+        # attributes
+        params = {name: value for name, value in vars(estimator).items()
+                  if not name.endswith('_')}
+    return {name: value for name, value in params.items()
+            if name not in IGNORED_PARAMS}
+
+
+def code_version(estimator):
+    """sklearn and numpy versions plus the source of the estimator's class.
+
+    Editing a local module such as bagging.py changes the version, so
+    artifacts trained by old code are not reused.
+    """
+    sha = hashlib.sha256(f'{sklearn.__version__} {np.__version__}'.encode())
+    try:
+        sha.update(inspect.getsource(type(estimator)).encode())
+    except (OSError, TypeError):
+        pass
+    return sha.hexdigest()[:16]
+
+
+def _fit(model, X, y):
+    if y is None:
+        model.fit(X)
+    else:
+        model.fit(X, y)
+
+
+def _distance(params, other):
+    """How far apart two parameter sets are, None if they are not close.
+
+    Close means that only numbers differ, distance is the sum of the
+    absolute log ratios of those numbers.
+    """
+    params = json.loads(params_json(params))
+    if params.keys() != other.keys():
+        return None
+    distance = 0.0
+    for name, value in params.items():
+        if value == other[name]:
+            continue
+        numeric = all(isinstance(v, numbers.Real) and
+                      not isinstance(v, bool) and v > 0
+                      for v in (value, other[name]))
+        if not numeric:
+            return None
+        distance += abs(math.log(value / other[name]))
+    return distance
+
+
+class ModelRegistry:
+    """Fitted models on disk, keyed by code version, parameters and data.
+
+    fit() returns the stored model when the same estimator was already
+    fitted on the same data, otherwise it trains and stores it. Arrays in
+    the stored models are memory mapped copy-on-write when loaded, so
+    opening a large model is fast and only the pages used are read.
+
+    Estimators with a warm_start parameter (MLPClassifier, random forests,
+    SGDClassifier, ...) whose parameters differ from a stored model only
+    in numbers, e.g. max_iter, alpha or n_estimators, continue training
+    from the closest stored model instead of starting from scratch.
+    """
+
+    def __init__(self, directory='model_registry', verbose=1):
+        self.directory = directory
+        self.verbose = verbose
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, estimator, fingerprint):
+        parts = [type(estimator).__name__, code_version(estimator),
+                 params_json(estimator_params(estimator)), fingerprint]
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def fit(self, estimator, X, y=None, name=None):
+        fingerprint = data_fingerprint(X, y)
+        key = self.key(estimator, fingerprint)
+        name = name or type(estimator).__name__
+        model = self.load(key)
+        if model is not None:
+            self._log(f'{name}: loaded {key[:12]} from {self.directory}')
+            return model
+
+        model, warm_from = self._warm_start_model(estimator, fingerprint)
+        start = time.perf_counter()
+        try:
+            _fit(model, X, y)
+        except ValueError:
+            if warm_from is None:
+                raise
+            # e.g. fewer trees than the stored forest, start over
+            model, warm_from = clone(estimator, safe=False), None
+            _fit(model, X, y)
+        fit_seconds = time.perf_counter() - start
+        if warm_from is not None:
+            # Stored as the estimator asked for, not with warm_start on
+            model.set_params(warm_start=estimator.get_params()['warm_start'])
+            self._log(f'{name}: warm started from {warm_from[:12]}, '
+                      f'trained in {fit_seconds:.1f}s')
+        else:
+            self._log(f'{name}: trained in {fit_seconds:.1f}s')
+        self.save(key, model, estimator, fingerprint, fit_seconds, warm_from)
+        return model
+
+    def load(self, key):
+        path = self._path(key, '.joblib')
+        if not os.path.exists(path):
+            return None
+        return joblib.load(path, mmap_mode='c')
+
+    def save(self, key, model, estimator, fingerprint, fit_seconds=None,
+             warm_from=None):
+        # Write to a temporary name first, a half written artifact is never
+        # picked up by another run
+        path = self._path(key, '.joblib')
+        joblib.dump(model, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        entry = {'key': key, 'estimator': type(estimator).__name__,
+                 'code_version': code_version(estimator),
+                 'params': json.loads(params_json(
+                     estimator_params(estimator))),
+                 'data': fingerprint, 'fit_seconds': fit_seconds,
+                 'warm_from': warm_from, 'created': time.time()}
+        with open(self._path(key, '.json'), 'w') as f:
+            json.dump(entry, f, indent=1)
+
+    def entries(self):
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    yield json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+
+    # The stored model closest to the estimator with warm_start enabled, or
+    # a fresh clone when there is none
+    def _warm_start_model(self, estimator, fingerprint):
+        if 'warm_start' not in estimator_params(estimator):
+            return clone(estimator, safe=False), None
+        params = estimator_params(estimator)
+        version = code_version(estimator)
+        best, best_distance = None, math.inf
+        for entry in self.entries():
+            if (entry['estimator'] != type(estimator).__name__
+                    or entry['code_version'] != version
+                    or entry['data'] != fingerprint):
+                continue
+            distance = _distance({**params, 'warm_start': False},
+                                 {**entry['params'], 'warm_start': False})
+            if distance is not None and distance < best_distance:
+                best, best_distance = entry['key'], distance
+        model = self.load(best) if best is not None else None
+        if model is None:
+            return clone(estimator, safe=False), None
+        model.set_params(**{**params, 'warm_start': True})
+        return model, best
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key + extension)
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+
+from parallel import attach_array, share_array, worker_data, worker_pool
+
+
+def _attach_training_data(data):
+    X, block = attach_array(data['X'])
+    # Keep the block referenced for as long as the worker lives
+    return {**data, 'X': X, 'block': block}
+
+
+def _fit_label(label):
+    data = worker_data
+    model = clone(data['estimator'])
+    model.fit(data['X'], (data['y'] == label).astype(np.int8))
+    return model
+
+
+class OneVsAllClassifier:
+    """One binary classifier per label, trained in parallel.
+
+    The training matrix is converted to float64 once and shared with the
+    worker processes (memory map or shared memory block), instead of being
+    pickled and converted again for every label.
+
+    Prediction is the argmax over all decision functions. With
+    calibrate=True, a held out calibration_fraction of the rows is used to
+    fit a sigmoid to each decision function, which gives predict_proba
+    without SVC(probability=True)'s internal 5-fold cross-validation.
+    """
+
+    def __init__(self, estimator, n_jobs=None, calibrate=False,
+                 calibration_fraction=0.1, random_state=0):
+        self.estimator = estimator
+        self.n_jobs = n_jobs
+        self.calibrate = calibrate
+        self.calibration_fraction = calibration_fraction
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        X_train, y_train = X, y
+        if self.calibrate:
+            rng = np.random.default_rng(self.random_state)
+            order = rng.permutation(len(y))
+            n_calibration = max(1, int(len(y) * self.calibration_fraction))
+            calibration_rows = np.sort(order[:n_calibration])
+            train_rows = np.sort(order[n_calibration:])
+            X_train, y_train = X[train_rows], y[train_rows]
+
+        n_jobs = min(self.n_jobs or os.cpu_count() or 1, len(self.classes_))
+        if n_jobs == 1:
+            X_shared, block = np.asarray(X_train, dtype=np.float64), None
+            setup = None
+        else:
+            X_shared, block = share_array(X_train)
+            setup = _attach_training_data
+        try:
+            with worker_pool(n_jobs, dict(estimator=self.estimator,
+                                          X=X_shared, y=y_train),
+                             setup) as pool:
+                self.estimators_ = list(pool.map(_fit_label, self.classes_))
+        finally:
+            if block is not None:
+                block.close()
+                block.unlink()
+
+        if self.calibrate:
+            scores = self.decision_function(X[calibration_rows])
+            self.calibrators_ = [
+                LogisticRegression().fit(scores[:, [i]],
+                                         y[calibration_rows] == label)
+                for i, label in enumerate(self.classes_)]
+        return self
+
+    def decision_function(self, X):
+        """Decision values of every label's model, shape (samples, labels)"""
+        return np.column_stack([model.decision_function(X)
+                                for model in self.estimators_])
+
+    def predict(self, X):
+        return self.classes_[self.decision_function(X).argmax(axis=1)]
+
+    def predict_proba(self, X):
+        if not self.calibrate:
+            raise AttributeError('predict_proba needs calibrate=True')
+        scores = self.decision_function(X)
+        proba = np.column_stack([
+            calibrator.predict_proba(scores[:, [i]])[:, 1]
+            for i, calibrator in enumerate(self.calibrators_)])
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def score(self, X, y):
+        return np.mean(self.predict(X) == np.asarray(y))
@@ -0,0 +1,82 @@
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Data of the current worker process, set once by the pool initializer so
+# it is not pickled again for every task
+worker_data = {}
+
+
+def init_worker(data, setup=None):
+    """Pool initializer: worker_data becomes data, or setup(data) to e.g.
+    attach shared arrays that cannot be pickled as they are
+    """
+    worker_data.clear()
+    worker_data.update(setup(data) if setup is not None else data)
+
+
+class InlineExecutor(Executor):
+    """Executor that runs every task right away in this process, so
+    n_jobs=1 starts no processes and pickles nothing
+    """
+
+    def __init__(self, data, setup=None):
+        init_worker(data, setup)
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        worker_data.clear()
+
+
+def worker_pool(n_jobs, data, setup=None):
+    """Executor whose workers find data in worker_data.
+
+    data is sent to every worker once, when it starts, instead of with
+    every task. With n_jobs=1 the tasks run in this process.
+    """
+    if n_jobs == 1:
+        return InlineExecutor(data, setup)
+    return ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker,
+                               initargs=(data, setup))
+
+
+def share_array(array, dtype=np.float64):
+    """Describe an array so worker processes can map it without a copy.
+
+    Memory maps of the right dtype are reopened from their file, anything
+    else is converted once into a shared memory block. Returns
+    (description, block), the block (or None) must be closed and unlinked
+    by the caller.
+    """
+    dtype = np.dtype(dtype)
+    if (isinstance(array, np.memmap) and array.filename is not None
+            and array.dtype == dtype):
+        base = array
+        while isinstance(base.base, np.memmap):
+            base = base.base
+        if array.flags.c_contiguous:
+            offset = base.offset + (array.__array_interface__['data'][0]
+                                    - base.__array_interface__['data'][0])
+            return ('memmap', array.filename, array.dtype.str, array.shape,
+                    offset), None
+    size = max(int(np.prod(array.shape)) * dtype.itemsize, 1)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    np.ndarray(array.shape, dtype, buffer=block.buf)[...] = array
+    return ('shm', block.name, dtype.str, array.shape, 0), block
+
+
+def attach_array(description):
+    kind, name, dtype, shape, offset = description
+    if kind == 'memmap':
+        return np.memmap(name, dtype=dtype, mode='r', shape=shape,
+                         offset=offset), None
+    block = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype, buffer=block.buf), block
@@ -0,0 +1,402 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+LOG_PATH = 'profile_runs.jsonl'
+# Stages at least this much slower or bigger than the baseline are flagged
+REGRESSION_THRESHOLD = 0.1
+METRICS = ('wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'alloc_peak_mb')
+# Smaller differences are noise, whatever their relative size
+MIN_DIFFERENCE = {'wall_seconds': 0.5, 'cpu_seconds': 0.5,
+                  'peak_rss_mb': 10, 'alloc_peak_mb': 10}
+
+# The profiler profile_stage() records to, created on first use
+_profiler = None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, None if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_rss():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def cpu_time():
+    """CPU seconds of this process and of its finished child processes,
+    e.g. the workers of a process pool that was shut down
+    """
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Stage:
+
+    def __init__(self, name):
+        self.name = name
+        self.peak_rss = 0
+        self.alloc_peak = 0
+
+
+class Profiler:
+    """Records wall time, CPU time, peak RSS and allocation peak per stage.
+
+    Every finished stage is appended to log_path as one JSON object, with
+    the run it belongs to, so interrupted runs keep their stages. Stages
+    can be nested, the inner stage's name is prefixed with the outer one.
+
+    Peak RSS is sampled every sample_interval seconds in a background
+    thread. The allocation peak is the highest memory traced by
+    tracemalloc during the stage, which includes NumPy arrays; tracing
+    slows down Python heavy code, trace_allocations=False switches it off.
+    The first stage starts tracemalloc and it stays on for the rest of
+    the process, in a notebook for the rest of the kernel, so all later
+    code runs traced and the wall times of later stages include that
+    overhead.
+
+    run_name groups the runs of one notebook in the log. It defaults to
+    $PROFILE_RUN_NAME or 'interactive'; notebooks name their runs with
+    set_run_name().
+    """
+
+    def __init__(self, run_name=None, log_path=LOG_PATH,
+                 trace_allocations=True, sample_interval=0.05):
+        self.run_name = run_name or os.environ.get('PROFILE_RUN_NAME',
+                                                   'interactive')
+        self.log_path = log_path
+        self.trace_allocations = trace_allocations
+        self.sample_interval = sample_interval
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stack = []
+        self.records = []
+        self.lock = threading.Lock()
+        self.sampler = None
+        self.environment = {
+            'commit': git_commit(), 'host': platform.node(),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'cpus': os.cpu_count()}
+
+    @contextmanager
+    def stage(self, name):
+        if self.stack:
+            name = f'{self.stack[-1].name}/{name}'
+        stage = Stage(name)
+        if self.trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._update_alloc_peaks()
+            tracemalloc.reset_peak()
+            alloc_start = tracemalloc.get_traced_memory()[0]
+        rss = current_rss()
+        stage.peak_rss = rss if rss is not None else 0
+        with self.lock:
+            self.stack.append(stage)
+        self._start_sampler()
+        wall_start, cpu_start = time.perf_counter(), cpu_time()
+        try:
+            yield stage
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = cpu_time() - cpu_start
+            self._sample()
+            if self.trace_allocations:
+                self._update_alloc_peaks()
+            with self.lock:
+                self.stack.pop()
+            peak_rss = stage.peak_rss if rss is not None else max_rss()
+            record = {
+                'run_id': self.run_id, 'run_name': self.run_name,
+                'stage': stage.name, 'time': time.time(),
+                'wall_seconds': round(wall, 4),
+                'cpu_seconds': round(cpu, 4),
+                'peak_rss_mb': round(peak_rss / 2 ** 20, 2),
+                'alloc_peak_mb': (round((stage.alloc_peak - alloc_start)
+                                        / 2 ** 20, 2)
+                                  if self.trace_allocations else None),
+                **self.environment}
+            self.records.append(record)
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    # The traced peak since the last reset counts for every open stage
+    def _update_alloc_peaks(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        for stage in self.stack:
+            stage.alloc_peak = max(stage.alloc_peak, peak)
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is None:
+            return
+        with self.lock:
+            for stage in self.stack:
+                stage.peak_rss = max(stage.peak_rss, rss)
+
+    def _start_sampler(self):
+        if self.sampler is not None and self.sampler.is_alive():
+            return
+
+        def sample():
+            while self.stack:
+                self._sample()
+                time.sleep(self.sample_interval)
+
+        self.sampler = threading.Thread(target=sample, daemon=True)
+        self.sampler.start()
+
+
+def get_profiler():
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
+
+
+def set_profiler(profiler):
+    global _profiler
+    _profiler = profiler
+
+
+def set_run_name(run_name):
+    """Log the stages of this process under run_name, e.g. the notebook's
+    name, so reports compare them only with runs of the same notebook
+    """
+    get_profiler().run_name = run_name
+
+
+def profile_stage(name):
+    """Context manager that records a stage with the current profiler"""
+    return get_profiler().stage(name)
+
+
+def read_runs(log_path=LOG_PATH, run_name=None):
+    """Logged runs, oldest first, as a list of (run_id, {stage: record})"""
+    runs = {}
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted write
+                continue
+            if run_name is not None and record['run_name'] != run_name:
+                continue
+            runs.setdefault(record['run_id'], {})[record['stage']] = record
+    return sorted(runs.items(),
+                  key=lambda run: min(r['time'] for r in run[1].values()))
+
+
+def compare_runs(log_path=LOG_PATH, run_name=None, baseline='previous'):
+    """Every stage of the latest run against a baseline.
+
+    baseline is 'previous' (the run before the latest), 'best' (the
+    lowest value of every metric over all earlier runs) or a run id.
+    Returns one dict per stage with the latest and baseline values and
+    the relative change of every metric. Without a run_name the latest run
+    is only compared with earlier runs of the same notebook.
+    """
+    runs = read_runs(log_path, run_name)
+    if not runs:
+        return []
+    latest_id, latest = runs[-1]
+    if run_name is None:
+        run_name = _run_name(latest)
+        runs = [run for run in runs if _run_name(run[1]) == run_name]
+    earlier = [stages for _, stages in runs[:-1]]
+    if baseline not in ('previous', 'best'):
+        earlier = [stages for run_id, stages in runs if run_id == baseline]
+    elif baseline == 'previous':
+        earlier = earlier[-1:]
+
+    rows = []
+    for stage, record in latest.items():
+        history = [stages[stage] for stages in earlier if stage in stages]
+        row = {'stage': stage, 'run_id': latest_id}
+        for metric in METRICS:
+            value = record.get(metric)
+            values = [r[metric] for r in history if r.get(metric) is not None]
+            base = min(values) if values else None
+            row[metric] = value
+            row[f'{metric}_baseline'] = base
+            row[f'{metric}_difference'] = (
+                value - base if value is not None and base is not None
+                else None)
+            row[f'{metric}_change'] = (
+                (value - base) / base
+                if value is not None and base else None)
+        rows.append(row)
+    return rows
+
+
+def _run_name(stages):
+    return next(iter(stages.values()))['run_name']
+
+
+def regressions(rows, threshold=REGRESSION_THRESHOLD):
+    """(stage, metric, change) of every metric that got worse by more
+    than threshold and by more than its MIN_DIFFERENCE
+    """
+    return [(row['stage'], metric, row[f'{metric}_change'])
+            for row in rows for metric in METRICS
+            if _regressed(row, metric, threshold)]
+
+
+def _regressed(row, metric, threshold):
+    change = row[f'{metric}_change']
+    return (change is not None and change > threshold
+            and row[f'{metric}_difference'] > MIN_DIFFERENCE[metric])
+
+
+def print_report(rows, threshold=REGRESSION_THRESHOLD):
+    if not rows:
+        print('No runs logged.')
+        return
+    print(f'Run {rows[0]["run_id"]}')
+    print(f"{'Stage':<34}{'Wall s':>14}{'CPU s':>14}{'Peak RSS MB':>16}"
+          f"{'Alloc MB':>16}")
+    for row in rows:
+        cells = []
+        for metric in METRICS:
+            value, change = row[metric], row[f'{metric}_change']
+            cell = '-' if value is None else f'{value:.2f}'
+            if change is not None:
+                flag = '!' if _regressed(row, metric, threshold) else ' '
+                cell += f' {change:+.0%}{flag}'
+            cells.append(cell)
+        print(f"{row['stage'][:33]:<34}{cells[0]:>14}{cells[1]:>14}"
+              f"{cells[2]:>16}{cells[3]:>16}")
+    flagged = regressions(rows, threshold)
+    if flagged:
+        print(f'\n{len(flagged)} metrics regressed by more than '
+              f'{threshold:.0%} (marked !)')
+
+
+def notebook_cells(path):
+    """Source of every code cell of a notebook, shell and magic lines
+    left out
+    """
+    with open(path, encoding='utf-8') as f:
+        notebook = json.load(f)
+    cells = []
+    for number, cell in enumerate(notebook['cells']):
+        if cell['cell_type'] != 'code':
+            continue
+        source = ''.join(line for line in cell['source']
+                         if not line.lstrip().startswith(('%', '!')))
+        cells.append((number, source))
+    return cells
+
+
+def run_notebook(path, cells=None, profiler=None):
+    """Execute a notebook's code cells headless, every cell a stage.
+
+    Cells run in order in one namespace, in the notebook's directory and
+    with matplotlib's non-interactive backend. cells limits the run to
+    the given cell numbers. Stages the notebook records itself with
+    profile_stage() are nested under their cell.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+    path = os.path.abspath(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    profiler = profiler or Profiler(run_name=name)
+    set_profiler(profiler)
+    directory = os.path.dirname(path)
+    previous_directory = os.getcwd()
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+    namespace = {'__name__': '__main__'}
+    try:
+        for number, source in notebook_cells(path):
+            if cells is not None and number not in cells:
+                continue
+            with profiler.stage(f'cell {number}'):
+                exec(compile(source, f'{name}[{number}]', 'exec'),
+                     namespace)
+    finally:
+        sys.path.remove(directory)
+        os.chdir(previous_directory)
+    return profiler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Profile notebook stages and compare runs')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='execute a notebook headless '
+                                          'under the profiler')
+    run.add_argument('notebook')
+    run.add_argument('--cells', type=lambda text: {
+        int(cell) for cell in text.split(',')},
+        help='comma separated cell numbers to run (default: all)')
+    run.add_argument('--no-trace', action='store_true',
+                     help='skip allocation tracing, it slows Python code')
+    report = commands.add_parser('report', help='compare the latest run '
+                                                'with earlier ones')
+    report.add_argument('--run-name', help='notebook name, e.g. '
+                                           'nn_exercise4 (default: the '
+                                           'notebook of the latest run)')
+    report.add_argument('--baseline', default='previous',
+                        help="'previous', 'best' or a run id")
+    report.add_argument('--fail-on-regression', action='store_true',
+                        help='exit with status 1 if a metric regressed')
+    for command in (run, report):
+        command.add_argument('--log', default=LOG_PATH)
+        command.add_argument('--threshold', type=float,
+                             default=REGRESSION_THRESHOLD)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Notebooks import this file as profiling, their stages must reach the
+    # profiler of this run rather than a second copy of the module
+    sys.modules.setdefault('profiling', sys.modules[__name__])
+    log = os.path.abspath(args.log)
+    run_name = None
+    if args.command == 'run':
+        run_name = os.path.splitext(os.path.basename(args.notebook))[0]
+        run_notebook(args.notebook, args.cells,
+                     Profiler(run_name, log, not args.no_trace))
+    else:
+        run_name = args.run_name
+    rows = compare_runs(log, run_name, args.baseline
+                        if args.command == 'report' else 'previous')
+    print_report(rows, args.threshold)
+    if (args.command == 'report' and args.fail_on_regression
+            and regressions(rows, args.threshold)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import StandardScaler
+
+from mnist_reader import iter_chunks
+
+
+def fit_scaler(X, rows=None, chunk_size=10000):
+    """StandardScaler fitted in one pass over chunks of X (or of X[rows])"""
+    scaler = StandardScaler()
+    if rows is None:
+        rows = np.arange(len(X))
+    for chunk in iter_chunks(rows, chunk_size=chunk_size):
+        scaler.partial_fit(X[chunk])
+    return scaler
+
+
+def scaled_batches(X, y, rows, scaler, batch_size):
+    """Yield (features, labels) batches of X[rows], scaled to float32.
+
+    Rows are read batch by batch, so only one batch is ever in memory.
+    """
+    mean = scaler.mean_.astype(np.float32)
+    scale = scaler.scale_.astype(np.float32)
+    for batch in iter_chunks(rows, chunk_size=batch_size):
+        # Sorted rows read a memory map front to back
+        batch = np.sort(batch)
+        features = (np.asarray(X[batch], dtype=np.float32) - mean) / scale
+        yield features, None if y is None else y[batch]
+
+
+class StreamingMLP(ClassifierMixin, BaseEstimator):
+    """MLPClassifier trained with partial_fit on streamed minibatches.
+
+    The scaler is fitted in a single pass, every minibatch is read from X
+    (typically a memory map) and normalized to float32 on the fly, and
+    training stops when the accuracy on a held out validation_fraction of
+    the rows has not improved by tol for n_iter_no_change epochs. The
+    weights of the best epoch are kept. chunk_size rows are read per
+    partial_fit call, which the MLP splits into batch_size minibatches.
+    Memory use is one chunk plus the model, whatever the size of the
+    dataset. It is a scikit-learn estimator, so it can be cloned and tuned
+    by a hyperparameter search.
+    """
+
+    def __init__(self, hidden_layer_sizes=(100,), activation='relu',
+                 alpha=0.0001, learning_rate_init=0.001, batch_size=256,
+                 chunk_size=4096, max_epochs=100, validation_fraction=0.1,
+                 n_iter_no_change=5, tol=1e-4, random_state=0,
+                 verbose=False):
+        self.hidden_layer_sizes = hidden_layer_sizes
+        self.activation = activation
+        self.alpha = alpha
+        self.learning_rate_init = learning_rate_init
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.max_epochs = max_epochs
+        self.validation_fraction = validation_fraction
+        self.n_iter_no_change = n_iter_no_change
+        self.tol = tol
+        self.random_state = random_state
+        self.verbose = verbose
+
+    def fit(self, X, y):
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        rng = np.random.default_rng(self.random_state)
+        order = rng.permutation(len(y))
+        n_validation = int(len(y) * self.validation_fraction)
+        validation_rows = np.sort(order[:n_validation])
+        train_rows = order[n_validation:]
+
+        self.scaler_ = fit_scaler(X, np.sort(train_rows))
+        self.model_ = MLPClassifier(
+            hidden_layer_sizes=self.hidden_layer_sizes,
+            activation=self.activation, alpha=self.alpha,
+            learning_rate_init=self.learning_rate_init,
+            batch_size=self.batch_size, random_state=self.random_state)
+
+        best_score, best_weights, stale_epochs = -np.inf, None, 0
+        self.validation_scores_ = []
+        for epoch in range(self.max_epochs):
+            rng.shuffle(train_rows)
+            for features, labels in scaled_batches(X, y, train_rows,
+                                                   self.scaler_,
+                                                   self.chunk_size):
+                self.model_.partial_fit(features, labels,
+                                        classes=self.classes_)
+            if n_validation == 0:
+                continue
+            score = self._score_rows(X, y, validation_rows)
+            self.validation_scores_.append(score)
+            if self.verbose:
+                print(f'Epoch {epoch + 1}: validation accuracy {score:.4f}')
+            if score > best_score + self.tol:
+                best_score, stale_epochs = score, 0
+                best_weights = ([w.copy() for w in self.model_.coefs_],
+                                [b.copy() for b in self.model_.intercepts_])
+            else:
+                stale_epochs += 1
+                if stale_epochs >= self.n_iter_no_change:
+                    break
+        if best_weights is not None:
+            self.model_.coefs_, self.model_.intercepts_ = best_weights
+        self.best_validation_score_ = best_score
+        self.n_epochs_ = epoch + 1
+        return self
+
+    def _score_rows(self, X, y, rows):
+        correct = 0
+        for features, labels in scaled_batches(X, y, rows, self.scaler_,
+                                               10000):
+            correct += np.sum(self.model_.predict(features) == labels)
+        return correct / len(rows)
+
+    def predict(self, X):
+        rows = np.arange(len(X))
+        return np.concatenate([
+            self.model_.predict(features)
+            for features, _ in scaled_batches(X, None, rows, self.scaler_,
+                                              10000)])
+
+    def score(self, X, y):
+        return np.mean(self.predict(X) == np.asarray(y))
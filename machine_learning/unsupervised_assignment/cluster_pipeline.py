@@ -0,0 +1,396 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import DBSCAN, AgglomerativeClustering, MiniBatchKMeans
+from sklearn.decomposition import IncrementalPCA
+from sklearn.manifold import TSNE, SpectralEmbedding
+from sklearn.metrics import adjusted_rand_score
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+try:
+    import umap
+except ImportError:
+    umap = None
+
+# CSV reader, process pool and hashing helpers shared with the supervised
+# assignment
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'supervised_assingment3'))
+from csv_reader import load_columns  # noqa: E402
+from fingerprints import data_fingerprint  # noqa: E402
+from parallel import (attach_array, share_array, worker_data,  # noqa: E402
+                      worker_pool)
+
+# File and label column of every dataset in data/
+DATASETS = {
+    'wine': ('winequality-red.csv', 'quality'),
+    'obesity': ('ObesityDataSet_raw_and_data_sinthetic.csv', 'NObeyesdad'),
+    'maternal': ('Maternal_Health_Risk_Data_Set.csv', 'RiskLevel'),
+}
+EMBEDDINGS = ('pca', 'tsne', 'umap')
+CLUSTERINGS = ('kmeans', 'dbscan', 'hierarchical')
+# Enough neighbors for t-SNE's default perplexity of 30
+DEFAULT_NEIGHBORS = 92
+# Neighbors kept in the sparse graphs of the UMAP layout and ward linkage
+LOCAL_NEIGHBORS = 15
+
+
+def load_dataset(name, data_dir='data'):
+    """Features, labels and feature names of one of the DATASETS.
+
+    The CSV is read with csv_reader, which detects the delimiter and a
+    UTF-8 BOM and caches the parsed columns, text columns are one-hot
+    encoded.
+    """
+    filename, label = DATASETS[name]
+    names, columns = load_columns(os.path.join(data_dir, filename))
+    columns = dict(zip(names, columns))
+    y = columns.pop(label)
+    numeric = [name for name, column in columns.items()
+               if column.dtype.kind != 'U']
+    features = [columns[name].astype(np.float64) for name in numeric]
+    feature_names = list(numeric)
+    for name, column in columns.items():
+        if column.dtype.kind == 'U':
+            categories, codes = np.unique(column, return_inverse=True)
+            features.append(np.eye(len(categories))[codes])
+            feature_names += [f'{name}_{category}'
+                              for category in categories]
+    return np.column_stack(features), y, feature_names
+
+
+def iter_chunks(n_rows, chunk_size):
+    for start in range(0, n_rows, chunk_size):
+        yield slice(start, min(start + chunk_size, n_rows))
+
+
+def reduce_dimensions(X, n_components=10, chunk_size=10000):
+    """Standardize and project X with IncrementalPCA, chunk by chunk.
+
+    Both the scaler and the PCA are fitted in passes over chunks of X, so
+    X can be a memory map larger than memory. Returns the float32
+    projection and the fitted (scaler, pca).
+    """
+    n_components = min(n_components, X.shape[1])
+    # IncrementalPCA needs at least n_components rows per chunk
+    chunk_size = max(chunk_size, n_components)
+    scaler = StandardScaler()
+    for rows in iter_chunks(len(X), chunk_size):
+        scaler.partial_fit(X[rows])
+    pca = IncrementalPCA(n_components=n_components)
+    for rows in iter_chunks(len(X), chunk_size):
+        if rows.stop - rows.start >= n_components:
+            pca.partial_fit(scaler.transform(X[rows]))
+    reduced = np.empty((len(X), n_components), dtype=np.float32)
+    for rows in iter_chunks(len(X), chunk_size):
+        reduced[rows] = pca.transform(scaler.transform(X[rows]))
+    return reduced, (scaler, pca)
+
+
+class NeighborGraph:
+    """k nearest neighbors of every row, computed once and shared.
+
+    t-SNE, the UMAP embedding, DBSCAN and hierarchical clustering all run
+    on this graph instead of each computing its own pairwise distances.
+    Neighbors are found chunk by chunk in n_jobs threads and written to
+    .npy files in cache_dir, keyed by a hash of the data, so a rerun (or
+    another process) memory maps them instead of searching again.
+    """
+
+    def __init__(self, X, n_neighbors=DEFAULT_NEIGHBORS, n_jobs=None,
+                 cache_dir=None, chunk_size=10000):
+        self.n_neighbors = min(n_neighbors, len(X) - 1)
+        self.indices, self.distances = self._load_or_search(
+            X, n_jobs, cache_dir, chunk_size)
+
+    @classmethod
+    def from_arrays(cls, indices, distances):
+        """Graph around already computed (e.g. memory mapped) arrays"""
+        graph = cls.__new__(cls)
+        graph.n_neighbors = indices.shape[1]
+        graph.indices, graph.distances = indices, distances
+        return graph
+
+    def _load_or_search(self, X, n_jobs, cache_dir, chunk_size):
+        paths = None
+        if cache_dir is not None:
+            fingerprint = data_fingerprint(X, chunk_rows=chunk_size)
+            name = f'{fingerprint[:16]}_k{self.n_neighbors}'
+            paths = [os.path.join(cache_dir, f'{name}_{part}.npy')
+                     for part in ('indices', 'distances')]
+            if all(os.path.exists(path) for path in paths):
+                return [np.load(path, mmap_mode='r') for path in paths]
+            os.makedirs(cache_dir, exist_ok=True)
+
+        shape = (len(X), self.n_neighbors)
+        if paths is None:
+            indices = np.empty(shape, dtype=np.int64)
+            distances = np.empty(shape, dtype=np.float32)
+        else:
+            # Written to .tmp files first so a crash never leaves a
+            # partial graph behind
+            indices = np.lib.format.open_memmap(
+                paths[0] + '.tmp', mode='w+', dtype=np.int64, shape=shape)
+            distances = np.lib.format.open_memmap(
+                paths[1] + '.tmp', mode='w+', dtype=np.float32, shape=shape)
+
+        search = NearestNeighbors(n_neighbors=self.n_neighbors + 1,
+                                  n_jobs=n_jobs).fit(X)
+        for rows in iter_chunks(len(X), chunk_size):
+            found_distances, found = search.kneighbors(X[rows])
+            # Drop every row itself, or the farthest neighbor for rows
+            # whose duplicates pushed them out of the list
+            own = found == np.arange(rows.start, rows.stop)[:, None]
+            own[~own.any(axis=1), -1] = True
+            indices[rows] = found[~own].reshape(-1, self.n_neighbors)
+            distances[rows] = found_distances[~own].reshape(
+                -1, self.n_neighbors)
+
+        if paths is None:
+            return indices, distances
+        for array, path in zip((indices, distances), paths):
+            array.flush()
+            os.replace(path + '.tmp', path)
+        return [np.load(path, mmap_mode='r') for path in paths]
+
+    def distance_graph(self, n_neighbors=None):
+        """Sparse (rows, rows) matrix of the distances to the first
+        n_neighbors neighbors of every row
+        """
+        k = n_neighbors or self.n_neighbors
+        n = len(self.indices)
+        return sparse.csr_matrix(
+            (np.asarray(self.distances[:, :k]).ravel(),
+             np.asarray(self.indices[:, :k]).ravel(),
+             np.arange(0, n * k + 1, k)), shape=(n, n))
+
+    def connectivity(self, n_neighbors=None):
+        """Symmetric 0/1 kNN adjacency matrix"""
+        graph = self.distance_graph(n_neighbors)
+        graph.data[:] = 1
+        return graph.maximum(graph.T).tocsr()
+
+
+def embed(method, X, graph, n_components=2, random_state=0):
+    """2-D embedding of X. Only 'pca' ignores the neighbor graph."""
+    if method == 'pca':
+        return np.asarray(X[:, :n_components])
+    if method == 'tsne':
+        # t-SNE needs 3 * perplexity + 2 neighbors per row
+        perplexity = min(30, max(2, (graph.n_neighbors - 2) // 3))
+        return TSNE(n_components=n_components, metric='precomputed',
+                    perplexity=perplexity, init='random',
+                    random_state=random_state).fit_transform(
+                        graph.distance_graph())
+    if method == 'umap':
+        if umap is not None:
+            return umap.UMAP(
+                n_components=n_components, n_neighbors=graph.n_neighbors,
+                precomputed_knn=(np.asarray(graph.indices),
+                                 np.asarray(graph.distances)),
+                random_state=random_state).fit_transform(X)
+        # Without umap-learn: the spectral layout UMAP starts from
+        return SpectralEmbedding(
+            n_components=n_components, affinity='precomputed',
+            random_state=random_state).fit_transform(
+                graph.connectivity(LOCAL_NEIGHBORS))
+    raise ValueError(f'Unknown embedding {method!r}')
+
+
+def cluster(method, X, graph, n_clusters=3, min_samples=5, eps=None,
+            chunk_size=10000, random_state=0):
+    """Cluster labels of every row of X, -1 is noise for DBSCAN"""
+    if method == 'kmeans':
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, n_init=3,
+                                 random_state=random_state)
+        for _ in range(10):
+            for rows in iter_chunks(len(X), chunk_size):
+                kmeans.partial_fit(X[rows])
+        return np.concatenate([kmeans.predict(X[rows])
+                               for rows in iter_chunks(len(X), chunk_size)])
+    if method == 'dbscan':
+        min_samples = min(min_samples, graph.n_neighbors)
+        if eps is None:
+            # Knee of the k-distance plot, approximated by a percentile
+            eps = float(np.percentile(graph.distances[:, min_samples - 1],
+                                      90))
+        return DBSCAN(eps=eps, min_samples=min_samples,
+                      metric='precomputed').fit_predict(
+                          graph.distance_graph())
+    if method == 'hierarchical':
+        # Ward linkage restricted to kNN edges instead of all pairs
+        return AgglomerativeClustering(
+            n_clusters=n_clusters, linkage='ward',
+            connectivity=graph.connectivity(LOCAL_NEIGHBORS)).fit_predict(X)
+    raise ValueError(f'Unknown clustering {method!r}')
+
+
+def neighbor_preservation(embedding, graph, n_neighbors=10):
+    """Fraction of every row's nearest neighbors that are still among its
+    nearest neighbors in the embedding
+    """
+    k = min(n_neighbors, graph.n_neighbors)
+    found = NearestNeighbors(n_neighbors=k + 1).fit(embedding).kneighbors(
+        embedding, return_distance=False)[:, 1:]
+    original = np.asarray(graph.indices[:, :k])
+    shared = [len(np.intersect1d(a, b, assume_unique=True))
+              for a, b in zip(found, original)]
+    return float(np.mean(shared)) / k
+
+
+def _attach_shared_data(data):
+    arrays, blocks = {}, []
+    for name in ('X', 'indices', 'distances'):
+        arrays[name], block = attach_array(data[name])
+        blocks.append(block)
+    graph = NeighborGraph.from_arrays(arrays['indices'], arrays['distances'])
+    # Keep the blocks referenced for as long as the worker lives
+    return {'X': arrays['X'], 'graph': graph, 'options': data['options'],
+            'blocks': blocks}
+
+
+def _run(kind, method):
+    data = worker_data
+    options = data['options']
+    start = time.perf_counter()
+    if kind == 'embedding':
+        result = embed(method, data['X'], data['graph'],
+                       random_state=options['random_state'])
+    else:
+        result = cluster(method, data['X'], data['graph'],
+                         n_clusters=options['n_clusters'],
+                         random_state=options['random_state'])
+    return kind, method, result, time.perf_counter() - start
+
+
+def compare_methods(X, y=None, embeddings=EMBEDDINGS,
+                    clusterings=CLUSTERINGS, n_components=10,
+                    n_neighbors=DEFAULT_NEIGHBORS, n_clusters=None,
+                    n_jobs=None, cache_dir='.knn_cache', random_state=0):
+    """Run every embedding and clustering method on the same data.
+
+    X is standardized and reduced with IncrementalPCA to n_components
+    once, the neighbor graph is built once, and the methods then run in
+    parallel processes that all reuse both. n_clusters defaults to the
+    number of classes in y. Returns a dict with the reduced data, the
+    embeddings, the cluster labels, timings and quality scores.
+    """
+    if n_clusters is None:
+        n_clusters = len(np.unique(y)) if y is not None else 3
+    timings = {}
+    start = time.perf_counter()
+    reduced, _ = reduce_dimensions(X, n_components)
+    timings['pca_reduction'] = time.perf_counter() - start
+    start = time.perf_counter()
+    graph = NeighborGraph(reduced, n_neighbors, n_jobs, cache_dir)
+    timings['neighbor_graph'] = time.perf_counter() - start
+
+    tasks = ([('embedding', method) for method in embeddings]
+             + [('clustering', method) for method in clusterings])
+    options = {'n_clusters': n_clusters, 'random_state': random_state}
+    n_workers = min(n_jobs or os.cpu_count() or 1, len(tasks))
+    data = dict(X=reduced, graph=graph, options=options)
+    setup, blocks = None, []
+    try:
+        if n_workers > 1:
+            # Workers map the cached graph files, and get the reduced data
+            # (or an uncached graph) through shared memory, instead of
+            # unpickling a private copy each
+            data, setup = {'options': options}, _attach_shared_data
+            for name, array in (('X', reduced), ('indices', graph.indices),
+                                ('distances', graph.distances)):
+                data[name], block = share_array(array, array.dtype)
+                blocks.append(block)
+        with worker_pool(n_workers, data, setup) as pool:
+            results = list(pool.map(_run, *zip(*tasks)))
+    finally:
+        for block in blocks:
+            if block is not None:
+                block.close()
+                block.unlink()
+
+    comparison = {'reduced': reduced, 'graph': graph, 'embeddings': {},
+                  'clusters': {}, 'timings': timings, 'scores': {}}
+    for kind, method, result, seconds in results:
+        timings[method] = seconds
+        if kind == 'embedding':
+            comparison['embeddings'][method] = result
+            comparison['scores'][method] = neighbor_preservation(result,
+                                                                 graph)
+        else:
+            comparison['clusters'][method] = result
+            if y is not None:
+                comparison['scores'][method] = adjusted_rand_score(y,
+                                                                   result)
+    return comparison
+
+
+def print_comparison(comparison):
+    print(f"{'Step':<16}{'Seconds':>10}{'Score':>10}")
+    for step, seconds in comparison['timings'].items():
+        score = comparison['scores'].get(step)
+        score = f'{score:>10.3f}' if score is not None else ''
+        print(f'{step:<16}{seconds:>10.2f}{score}')
+    print('Scores: embeddings keep this fraction of the 10 nearest '
+          'neighbors, clusterings are the adjusted Rand index to the labels')
+
+
+def plot_comparison(comparison, y, figsize=(15, 8)):
+    """One scatter plot per embedding colored by the labels, and one per
+    clustering on the first embedding
+    """
+    import matplotlib.pyplot as plt
+
+    embeddings = comparison['embeddings']
+    clusters = comparison['clusters']
+    columns = max(len(embeddings), len(clusters), 1)
+    fig, axes = plt.subplots(2, columns, figsize=figsize, squeeze=False)
+    codes = np.unique(y, return_inverse=True)[1]
+    for ax, (method, points) in zip(axes[0], embeddings.items()):
+        ax.scatter(points[:, 0], points[:, 1], c=codes, s=4, cmap='tab10')
+        ax.set_title(method)
+    background = next(iter(embeddings.values()), comparison['reduced'])
+    for ax, (method, labels) in zip(axes[1], clusters.items()):
+        ax.scatter(background[:, 0], background[:, 1], c=labels, s=4,
+                   cmap='tab10')
+        ax.set_title(method)
+    for ax in axes.flat:
+        ax.axis('off')
+    fig.tight_layout()
+    return fig
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare dimensionality reduction and clustering '
+                    'methods on one of the datasets')
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--neighbors', type=int, default=DEFAULT_NEIGHBORS)
+    parser.add_argument('--clusters', type=int,
+                        help='default: the number of classes')
+    parser.add_argument('--n-jobs', type=int)
+    parser.add_argument('--cache-dir', default='.knn_cache')
+    parser.add_argument('--plot', help='save the comparison plot here')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    X, y, _ = load_dataset(args.dataset, args.data_dir)
+    comparison = compare_methods(X, y, n_neighbors=args.neighbors,
+                                 n_clusters=args.clusters,
+                                 n_jobs=args.n_jobs,
+                                 cache_dir=args.cache_dir)
+    print_comparison(comparison)
+    if args.plot:
+        plot_comparison(comparison, y).savefig(args.plot)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,13 +11,15 @@ class MemberMenuActions(Enum):
     BROWSE_BY_SUBJECT = 1
     SEARCH_BY_AUTHOR_TITLE = 2
     CHECK_OUT = 3
-    LOGOUT = 4
+    ORDER_HISTORY = 4
+    LOGOUT = 5
 
 
 class SearchMenuActions(Enum):
     AUTHOR_SEARCH = 1
     TITLE_SEARCH = 2
-    GO_TO_MAIN_MENU = 3
+    AUTHOR_TITLE_SEARCH = 3
+    GO_TO_MAIN_MENU = 4
 
 
 def get_enum_value(menu_type, user_input):
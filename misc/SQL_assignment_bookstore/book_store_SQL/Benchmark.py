@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from getpass import getpass
+from BookstoreAdmin import BookstoreAdmin
+from BrowseAndSearch import BrowseAndSearch
+from Cart import Cart
+from CatalogCache import CatalogCache
+from CatalogLoader import CatalogLoader, book_row, read_sql
+from OrderAndShipping import OrderAndShipping
+from QueryInstrumentation import QueryInstrumentation
+from SQLiteDatabase import SQLiteDatabase
+
+
+BOOKS_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "..", "books.sql")
+BATCH_SIZE = 5000
+
+
+class ScriptedIO:
+
+    # Session I/O that answers prompts from a script and drops all output
+    def __init__(self) -> None:
+        self.answers = deque()
+
+    def feed(self, *answers):
+        self.answers.extend(answers)
+
+    def write(self, text=""):
+        pass
+
+    def read(self, prompt=""):
+        return self.answers.popleft()
+
+    def read_secret(self, prompt=""):
+        return self.read(prompt)
+
+
+class OperationStats:
+
+    # Latencies and query counts per operation, shared by all workers.
+    # Every operation is also an instrumentation action, so N+1 query
+    # patterns inside it get flagged.
+    def __init__(self, instrumentation: QueryInstrumentation) -> None:
+        self.instrumentation = instrumentation
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+
+    @contextmanager
+    def measure(self, operation):
+        queries_before = self.instrumentation.thread_queries()
+        start = time.perf_counter()
+        with self.instrumentation.action(operation):
+            yield
+        elapsed = time.perf_counter() - start
+        queries = self.instrumentation.thread_queries() - queries_before
+        with self.lock:
+            self.latencies[operation].append(elapsed)
+            self.queries[operation].append(queries)
+
+    def report(self):
+        rows = []
+        for operation, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            queries = self.queries[operation]
+            rows.append({
+                "operation": operation,
+                "count": len(latencies),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "queries_per_request": sum(queries) / len(queries),
+            })
+        return rows
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values, p):
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+# The books.sql rows, parsed (and unescaped) like a bulk catalog load
+def load_book_templates(path=BOOKS_SQL):
+    with open(path, encoding="utf-8") as f:
+        return [book_row(record) for record in read_sql(f)]
+
+
+# Scale books.sql up to num_books rows. Rows are yielded one at a time so
+# catalogs far bigger than memory can be generated.
+def generate_books(templates, num_books, rng):
+    for i in range(num_books):
+        _, author, title, price, subject = templates[i % len(templates)]
+        edition = i // len(templates)
+        if edition:
+            title = f"{title} (Edition {edition + 1})"
+            price = round(float(price) * rng.uniform(0.8, 1.2), 2)
+        yield (f"B{i:09d}", author, title[:200], float(price), subject)
+
+
+def generate_members(num_members):
+    for i in range(num_members):
+        yield (f"First{i}", f"Last{i}", f"{i} Main Street",
+               "Uppsala, SE", 75000 + i % 1000, f"070{i:07d}",
+               member_email(i), member_password(i))
+
+
+def member_email(i):
+    return f"member{i}@example.com"
+
+
+def member_password(i):
+    return f"password{i}"
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Empty the bookstore tables and fill them with a synthetic data set
+def populate(db, templates, num_books, num_members, rng):
+    for table in ("order_totals", "book_sales", "daily_revenue",
+                  "odetails", "orders", "cart", "members", "books"):
+        db.execute_with_commit(f"DELETE FROM {table};")
+    CatalogLoader(db, BATCH_SIZE).load_rows(
+        generate_books(templates, num_books, rng))
+    for batch in batched(generate_members(num_members), BATCH_SIZE):
+        db.execute_many_with_commit(
+            """INSERT INTO members (fname, lname, address, city, zip,
+            phone, email, password)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""", batch)
+
+
+# One scripted member visit: login -> browse -> search -> add to cart ->
+# checkout, timing every step through the real bookstore classes
+def run_user(db, cache, stats, member_number, subjects, words, rng):
+    io = ScriptedIO()
+    bas = BrowseAndSearch(cache, io)
+    admin = BookstoreAdmin(io)
+    oas = OrderAndShipping(io)
+
+    with stats.measure("login"):
+        member = admin.get_member(db, member_email(member_number),
+                                  member_password(member_number))
+
+    with stats.measure("browse"):
+        subjects_with_key = bas.get_subjects_with_key(db)
+        subject = bas.choose_subject(rng.randint(1, len(subjects)),
+                                     subjects_with_key)
+        pages = bas.get_books_from_subject(db, subject, 2)
+        browsed = next(pages, []) + next(pages, [])
+
+    with stats.measure("search"):
+        io.feed(rng.choice(words))
+        pages = bas.search_by_title(db, 3)
+        found = next(pages, [])
+
+    session_cart = Cart(db, member)
+    picks = [book[0] for book in rng.sample(browsed + found,
+                                            min(3, len(browsed + found)))]
+    for isbn in picks:
+        with stats.measure("add_to_cart"):
+            admin.addToCart(db, isbn, rng.randint(1, 10), member,
+                            session_cart)
+
+    with stats.measure("checkout"):
+        cart = oas.get_cart(db, member, session_cart)
+        if cart is not None and session_cart.flush():
+            oas.print_receipt(db, bas, cart)
+            order_number = admin.place_order(db, member)
+            session_cart.clear()
+            oas.get_order(db, order_number)
+
+    with stats.measure("order_history"):
+        history = admin.reports.stream_order_history(db, member, 10)
+        next(history, [])
+        admin.reports.get_member_totals(db, member)
+
+
+def run_workload(db, instrumentation, users, concurrency, num_members,
+                 seed):
+    stats = OperationStats(instrumentation)
+    cache = CatalogCache()
+    bas = BrowseAndSearch(cache, ScriptedIO())
+
+    subjects = bas.get_subjects_with_key(db)
+    with stats.measure("build_search_index"):
+        bas.search(db, "", ("title",))
+    words = sorted({word for word, _ in
+                    cache.search_index.postings["title"].items()
+                    if len(word) > 3})[:5000]
+
+    # Every worker works on its own members, so no two threads share a cart
+    def worker(worker_number):
+        rng = random.Random(seed + worker_number)
+        members = range(worker_number, num_members, concurrency)
+        visits = range(worker_number, users, concurrency)
+        for visit in range(len(visits)):
+            run_user(db, cache, stats,
+                     members[visit % len(members)], subjects, words, rng)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return stats.report(), elapsed
+
+
+def print_report(rows, elapsed, users):
+    print(f"\n{users} member visits in {elapsed:.2f}s "
+          f"({users / elapsed:.1f} visits/s)\n")
+    print(f"{'Operation':<20}{'Count':>8}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'Queries':>10}")
+    print(f"{'_' * 68}")
+    for row in rows:
+        print(f"{row['operation']:<20}{row['count']:>8}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['p99_ms']:>10.2f}{row['queries_per_request']:>10.1f}")
+
+
+def print_n_plus_one(instrumentation):
+    flagged = {(item["action"], item["fingerprint"])
+               for item in instrumentation.n_plus_one}
+    if not flagged:
+        return
+    print("\nRepeated queries inside one operation (possible N+1):")
+    for action, query in sorted(flagged):
+        print(f"  {action}: {query}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Load generator and latency benchmark for the book store")
+    parser.add_argument("--backend", choices=["sqlite", "mysql"],
+                        default="sqlite")
+    parser.add_argument("--sqlite-path",
+                        help="SQLite file to use (default: a temporary file)")
+    parser.add_argument("--mysql-user", default="root")
+    parser.add_argument("--mysql-database", default="book_store_bench",
+                        help="MySQL database with book_store_schema.sql "
+                             "loaded. Its contents are replaced.")
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=500,
+                        help="scripted member visits to run")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-load", action="store_true",
+                        help="reuse the data already in the database")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--query-log",
+                        help="write every query as JSON lines to this file")
+    parser.add_argument("--metrics",
+                        help="write Prometheus style query metrics to this "
+                             "file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.backend == "mysql":
+        from Database import Database
+        password = getpass("Enter SQL server password: ")
+        db = Database(args.mysql_user, password,
+                      pool_size=args.concurrency,
+                      database=args.mysql_database)
+    else:
+        path = args.sqlite_path or os.path.join(tempfile.mkdtemp(),
+                                                "book_store.db")
+        db = SQLiteDatabase(path)
+        db.create_schema()
+
+    instrumentation = QueryInstrumentation()
+
+    if not args.no_load:
+        print(f"Generating {args.books} books and {args.members} members...")
+        start = time.perf_counter()
+        populate(db, load_book_templates(), args.books, args.members,
+                 random.Random(args.seed))
+        print(f"Loaded in {time.perf_counter() - start:.2f}s")
+
+    # Loading is left out of the query statistics
+    db.add_hook(instrumentation)
+    rows, elapsed = run_workload(db, instrumentation, args.users,
+                                 args.concurrency, args.members, args.seed)
+    print_report(rows, elapsed, args.users)
+    print_n_plus_one(instrumentation)
+    if args.query_log:
+        instrumentation.export_json_lines(args.query_log)
+    if args.metrics:
+        with open(args.metrics, "w") as f:
+            f.write(instrumentation.prometheus_text())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"backend": args.backend, "books": args.books,
+                       "members": args.members, "users": args.users,
+                       "concurrency": args.concurrency, "seconds": elapsed,
+                       "operations": rows}, f, indent=2)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,53 @@
 from Database import Database
-from BrowseAndSearch import BrowseAndSearch
-from getpass import getpass
+from Cart import CART_COLUMNS
+from SalesReports import SalesReports
+from SessionIO import ConsoleIO
 import datetime
-from mysql.connector import connect, Error
+from mysql.connector import Error
 
 
 class BookstoreAdmin:
 
-    def addToCart(self, db: Database, isbn, qty, member):
+    def __init__(self, io=None) -> None:
+        self.io = io if io is not None else ConsoleIO()
+        self.reports = SalesReports(self.io)
+
+    # Add books to the member's cart. With a session Cart the add is
+    # buffered in memory, otherwise it is written right away. Adding a book
+    # that is already in the cart adds to its quantity.
+    def addToCart(self, db: Database, isbn, qty, member, cart=None):
         if qty < 1 or qty > 10:
             return False
-        user_id = member[0]
+        if cart is not None:
+            return cart.add(isbn, qty)
         try:
-            insert_query = f"""INSERT INTO cart (userid, isbn, qty)
-                            VALUES ("{user_id}", "{isbn}", "{qty}"); """
-            db.execute_with_commit(insert_query)
+            db.upsert_many_with_commit("cart", CART_COLUMNS,
+                                       ("userid", "isbn"),
+                                       [(member[0], isbn, qty)],
+                                       add=("qty",))
             return True
         except Exception as e:
-            print(e)
+            self.io.write(f"Could not add to cart: {e}")
             return False
 
     def deleteCart(self, db: Database, member):
-        delete_query = f"""DELETE FROM cart
-                    WHERE userid = {member[0]}"""
+        delete_query = """DELETE FROM cart
+                    WHERE userid = %s"""
         try:
-            db.execute_with_commit(delete_query)
+            db.execute_with_commit(delete_query, (member[0],))
             return True
         except Exception as e:
-            print(e)
+            self.io.write(f"Could not empty the cart: {e}")
             return False
 
+    # Point lookup on the members.email unique index
     def get_member(self, db: Database, email, password):
-        members = self.get_all_members(db)
+        query = """SELECT *
+                    FROM members
+                    WHERE email = %s;"""
+        members = db.execute_with_fetchall(query, (email,))
         for member in members:
-            if member[8] == password and member[7] == email:
+            if member[8] == password:
                 return member
 
         return None
@@ -45,65 +59,76 @@ class BookstoreAdmin:
         return members
 
     def create_member(self, db: Database):
-        fname = input("First name: ")
-        lname = input("Last name: ")
-        street_address = input("Enter street address: ")
-        city = input("Enter city: ")
-        state = input("State: ")
-        zip_code = input("Enter zip: ")
-        phone = input("Enter phone: ")
-        email = input("Enter email: ")
-        password = getpass("Enter password: ")
+        fname = self.io.read("First name: ")
+        lname = self.io.read("Last name: ")
+        street_address = self.io.read("Enter street address: ")
+        city = self.io.read("Enter city: ")
+        state = self.io.read("State: ")
+        zip_code = self.io.read("Enter zip: ")
+        phone = self.io.read("Enter phone: ")
+        email = self.io.read("Enter email: ")
+        password = self.io.read_secret("Enter password: ")
 
         try:
-            insert_query = f""" INSERT INTO members (fname,lname,address,
+            insert_query = """ INSERT INTO members (fname,lname,address,
                             city,zip,phone,email,password)
-            VALUES("{fname}","{lname}","{street_address}",
-            "{city + ", " + state}", "{zip_code}","{phone}",
-            "{email}","{password}");   """
-            db.execute_with_commit(insert_query)
+            VALUES(%s, %s, %s, %s, %s, %s, %s, %s);   """
+            db.execute_with_commit(insert_query,
+                                   (fname, lname, street_address,
+                                    city + ", " + state, zip_code, phone,
+                                    email, password))
             return True
         except Exception as e:
-            print(e)
+            self.io.write(f"Could not create the member: {e}")
             return False
 
-    def create_order(self, db: Database, member):
+    # Place an order for everything in the member's cart as one
+    # transaction: the order row, all its odetails priced by a join against
+    # books, the order history and sales summary tables, and emptying the
+    # cart. Returns the order number, or None if anything failed and the
+    # transaction was rolled back, e.g. when a book in the cart is no
+    # longer in the catalog.
+    def place_order(self, db: Database, member):
         current_date = datetime.date.today()
         sql_date = current_date.strftime('%Y-%m-%d')
-        query = f""" INSERT INTO orders (userid, created, shipAddress,
+        order_query = """ INSERT INTO orders (userid, created, shipAddress,
                                         shipCity, shipZip)
-                    VALUES('{member[0]}', '{sql_date}',
-                    '{member[3]}', '{member[4]}', '{member[5]}'); """
+                    VALUES(%s, %s, %s, %s, %s); """
+        lines_query = """ SELECT c.isbn, c.qty, c.qty * b.price, b.subject
+                    FROM cart c
+                    LEFT JOIN books b ON b.isbn = c.isbn
+                    WHERE c.userid = %s; """
+        details_query = """ INSERT INTO odetails (ono, isbn, qty, amount)
+                    VALUES (%s, %s, %s, %s); """
+        delete_query = """DELETE FROM cart
+                    WHERE userid = %s"""
         try:
-            db.execute_with_commit(query)
-            order_number_query = "SELECT LAST_INSERT_ID();"
-            order_number = db.execute_with_fetchall(order_number_query)
-            return order_number[0][0]
+            with db.transaction() as connection:
+                order_number = connection.execute(
+                    order_query, (member[0], sql_date, member[3], member[4],
+                                  member[5])).lastrowid
+                # The same lines go to odetails and the summary tables
+                lines = connection.fetchall(lines_query, (member[0],))
+                missing = [isbn for isbn, _, amount, _ in lines
+                           if amount is None]
+                if missing:
+                    raise ValueError("No longer available: "
+                                     + ", ".join(missing))
+                connection.execute_many(
+                    details_query, [(order_number, isbn, qty, amount)
+                                    for isbn, qty, amount, _ in lines])
+                self.reports.record_order(db, connection, order_number,
+                                          member[0], sql_date, lines)
+                connection.execute(delete_query, (member[0],))
+            return order_number
         except Exception as e:
-            print(e)
+            self.io.write(f"Could not place the order: {e}")
             return None
 
-    def create_order_details(self, db: Database, bas: BrowseAndSearch, cart,
-                             order_number):
-
+    # Log in by opening the connection pool, returns None on failure
+    def database_login(self, username, password, pool_size=5):
         try:
-            for item in cart:
-                amount = item[2] * bas.get_book_isbn(db, item[1])[3]
-                query = f""" INSERT INTO odetails (ono, isbn, qty,
-                                                amount)
-                            VALUES('{order_number}', '{item[1]}',
-                            '{item[2]}', '{amount}'); """
-                db.execute_with_commit(query)
-            return True
-        except Exception as e:
-            print(e)
-            return False
-
-    def database_login(self, username, password):
-        try:
-            connect(host="localhost", user=username, password=password,
-                    database="book_store")
-            return True
+            return Database(username, password, pool_size=pool_size)
         except Error as e:
             print(f"An error occurred: {e}")
-            return False
+            return None
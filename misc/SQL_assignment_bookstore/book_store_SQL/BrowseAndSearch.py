@@ -1,15 +1,26 @@
 from Database import Database
+from CatalogCache import CatalogCache
+from SessionIO import ConsoleIO
 
 
 class BrowseAndSearch:
 
+    # Catalog reads go through the cache and only hit MySQL on a miss.
+    # Sessions share one cache but each has its own I/O.
+    def __init__(self, cache: CatalogCache = None, io=None) -> None:
+        self.cache = cache if cache is not None else CatalogCache()
+        self.io = io if io is not None else ConsoleIO()
+
     def get_subjects_with_key(self, db: Database):
         subjects_with_key = {}
+        self.cache.check_version(db)
         query = """ SELECT DISTINCT subject
                     FROM books
                     ORDER BY subject;
                 """
-        subjects = db.execute_with_fetchall(query)
+        subjects = self.cache.get_or_load(
+            self.cache.subjects, "subjects",
+            lambda: db.execute_with_fetchall(query))
 
         i = 0
         for subject in subjects:
@@ -28,32 +39,63 @@ class BrowseAndSearch:
                     for subject, number in subjects_with_key.items():
                         if choice == number:
                             return subject
-                    print("\nInvalid input. Please choose a valid subject "
-                          "number.\n")
+                    self.io.write("\nInvalid input. Please choose a valid "
+                                  "subject number.\n")
                 else:
-                    print(f"\nInvalid input. Please enter a number between "
-                          f"1 and {len(subjects_with_key)}.\n")
+                    self.io.write(f"\nInvalid input. Please enter a number "
+                                  f"between 1 and {len(subjects_with_key)}.\n")
             except ValueError:
-                print("Invalid input. Please enter a valid integer.")
+                self.io.write("Invalid input. Please enter a valid integer.")
 
             # Prompt the user to enter a new choice
-            choice = input(f"\nChoose a subject (enter a number between 1 "
-                           f"and {len(subjects_with_key)}\n): ")
-
-    def get_books_from_subject(self, db: Database, subject):
-        query = f"""SELECT *
-                    FROM books b
-                    WHERE b.subject = '{subject}'
-                    ORDER BY title"""
-        books_from_subject = db.execute_with_fetchall(query)
-        print(f"\n{len(books_from_subject)} books available on this subject "
-              f"({subject})\n")
-        return books_from_subject
+            choice = self.io.read(f"\nChoose a subject (enter a number "
+                                  f"between 1 and "
+                                  f"{len(subjects_with_key)}\n): ")
+
+    def get_books_from_subject(self, db: Database, subject, page_size):
+        self.io.write(f"\nBooks available on this subject ({subject})\n")
+        return self.stream_books(db, subject, page_size)
+
+    # Fetch one page of a subject's books ordered by (title, isbn). Instead
+    # of an OFFSET the page starts right after the last (title, isbn) seen,
+    # so every page is a short range scan no matter how deep we browse.
+    def get_books_page(self, db: Database, subject, after, page_size):
+        self.cache.check_version(db)
+        if after is None:
+            query = """SELECT *
+                    FROM books
+                    WHERE subject = %s
+                    ORDER BY title, isbn
+                    LIMIT %s"""
+            params = (subject, page_size)
+        else:
+            query = """SELECT *
+                    FROM books
+                    WHERE subject = %s
+                        AND (title > %s OR (title = %s AND isbn > %s))
+                    ORDER BY title, isbn
+                    LIMIT %s"""
+            params = (subject, after[0], after[0], after[1], page_size)
+
+        return self.cache.get_or_load(
+            self.cache.subject_books, (subject, after, page_size),
+            lambda: self._load_books(db, query, params))
+
+    # Generator that streams a subject's books one page at a time
+    def stream_books(self, db: Database, subject, page_size):
+        after = None
+        while True:
+            page = self.get_books_page(db, subject, after, page_size)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after = (page[-1][2], page[-1][0])
 
     def display_books(self, books, start_index, no_books_to_display):
         book_count = len(books)
         if book_count == 0:
-            print("No books to display.")
+            self.io.write("No books to display.")
             return
         for i in range(start_index, start_index + no_books_to_display):
             index = i % book_count  # Ensure looping back to the beginning
@@ -61,12 +103,12 @@ class BrowseAndSearch:
                 self.print_book_info(books[index])
 
     def print_book_info(self, book):
-        print(f"Author: {book[1]}")
-        print(f"Title: {book[2]}")
-        print(f"ISBN: {book[0]}")
-        print(f"Price: {book[3]}")
-        print(f"Subject {book[4]}")
-        print("\n")
+        self.io.write(f"Author: {book[1]}")
+        self.io.write(f"Title: {book[2]}")
+        self.io.write(f"ISBN: {book[0]}")
+        self.io.write(f"Price: {book[3]}")
+        self.io.write(f"Subject {book[4]}")
+        self.io.write("\n")
 
     def isbn_match(self, isbn, books):
         for book in books:
@@ -76,38 +118,104 @@ class BrowseAndSearch:
         return False
 
     def get_all_books(self, db: Database):
+        self.cache.check_version(db)
         query = """SELECT *
                 FROM books;"""
-        all_books = db.execute_with_fetchall(query)
+        all_books = self.cache.get_or_load(
+            self.cache.all_books, "all_books",
+            lambda: self._load_books(db, query))
         return all_books
 
-    def search_by_author(self, db: Database):
-        author = input("Enter authors name or part of authors name: ")
-        query = f"""SELECT *
+    # Run a books query and fill the ISBN -> book map with the result
+    def _load_books(self, db: Database, query, params=()):
+        books = db.execute_with_fetchall(query, params)
+        self.cache.remember_books(books)
+        return books
+
+    def search_by_author(self, db: Database, page_size):
+        author = self.io.read("Enter authors name or part of authors "
+                              "name: ")
+        isbns = self.search(db, author, ("author",))
+        self.io.write(f"\n{len(isbns)} books found ({author}).\n")
+        return self.stream_isbns(db, isbns, page_size)
+
+    def search_by_title(self, db: Database, page_size):
+        title = self.io.read("Enter title or part of the title: ")
+        isbns = self.search(db, title, ("title",))
+        self.io.write(f"\n{len(isbns)} books found ({title}).\n")
+        return self.stream_isbns(db, isbns, page_size)
+
+    def search_by_author_and_title(self, db: Database, page_size):
+        text = self.io.read("Enter words from the author and/or title: ")
+        isbns = self.search(db, text, ("author", "title"))
+        self.io.write(f"\n{len(isbns)} books found ({text}).\n")
+        return self.stream_isbns(db, isbns, page_size)
+
+    # Search the author/title index, returns ISBNs ranked by relevance
+    def search(self, db: Database, text, fields):
+        self.cache.check_version(db)
+        index = self.cache.search_index
+        if not index.built:
+            query = """SELECT isbn, author, title
+                    FROM books;"""
+            index.build(db.execute_with_fetchall(query))
+        elif index.stale:
+            isbns = list(index.stale)
+            index.refresh(isbns, self.get_books_by_isbns(db, isbns).values())
+        return index.search(text, fields)
+
+    # Generator that streams the books for a list of ISBNs page by page
+    def stream_isbns(self, db: Database, isbns, page_size):
+        for start in range(0, len(isbns), page_size):
+            page_isbns = isbns[start:start + page_size]
+            books = self.get_books_by_isbns(db, page_isbns)
+            page = [books[isbn] for isbn in page_isbns if isbn in books]
+            if page:
+                yield page
+
+    # Point lookup on the books.isbn primary key
+    def get_book_isbn(self, db: Database, isbn):
+        self.cache.check_version(db)
+        book = self.cache.books.get(isbn)
+        if book is not None:
+            return book
+        query = """SELECT *
                 FROM books
-                WHERE author LIKE '%{author}%'"""
-        search_result = db.execute_with_fetchall(query)
-        print(f"\n{len(search_result)} books found ({author}).\n")
-        return search_result
-
-    def search_by_title(self, db: Database):
-        title = input("Enter title or part of the title: ")
+                WHERE isbn = %s;"""
+        books = self._load_books(db, query, (isbn,))
+        if not books:
+            return None
+        return books[0]
+
+    # Resolve several ISBNs in one round trip, returns a dict isbn -> book.
+    # Books already in the cache are not queried again. The IN list is
+    # padded to a power of two so only a handful of statement shapes ever
+    # get prepared.
+    def get_books_by_isbns(self, db: Database, isbns):
+        self.cache.check_version(db)
+        found = {}
+        missing = []
+        for isbn in dict.fromkeys(isbns):
+            book = self.cache.books.get(isbn)
+            if book is None:
+                missing.append(isbn)
+            else:
+                found[isbn] = book
+        if not missing:
+            return found
+        size = 1
+        while size < len(missing):
+            size *= 2
+        params = missing + [missing[-1]] * (size - len(missing))
+        placeholders = ", ".join(["%s"] * size)
         query = f"""SELECT *
                 FROM books
-                WHERE title LIKE '%{title}%'"""
-        search_result = db.execute_with_fetchall(query)
-        print(f"\n{len(search_result)} books found ({title}).\n")
-        return search_result
-
-    def get_book_isbn(self, db: Database, isbn):
-        books = self.get_all_books(db)
-        for book in books:
-            if isbn == book[0]:
-                return book
-
-        return None
+                WHERE isbn IN ({placeholders});"""
+        books = self._load_books(db, query, params)
+        found.update((book[0], book) for book in books)
+        return found
 
     def display_subjects(self, db: Database):
         subject_with_key = self.get_subjects_with_key(db)
         for subject, number in subject_with_key.items():
-            print(f"{number}. {subject}")
+            self.io.write(f"{number}. {subject}")
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from Database import Database
+from SessionIO import ConsoleIO
+
+CART_COLUMNS = ("userid", "isbn", "qty")
+
+
+class Cart:
+
+    # Shopping cart of one member session. Adds are buffered in memory with
+    # the quantities merged per ISBN, and written to the cart table in one
+    # batched upsert when max_pending ISBNs or max_age seconds of changes
+    # are waiting, or when the session flushes at checkout and logout.
+    # The stored cart is read once, after that the cart is served from
+    # memory. Write errors are reported through the session's io.
+    def __init__(self, db: Database, member, max_pending=20,
+                 max_age=60, io=None) -> None:
+        self.db = db
+        self.member = member
+        self.io = io if io is not None else ConsoleIO()
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.stored = None
+        self.pending = OrderedDict()
+        self.pending_since = None
+
+    # Add qty copies of a book, flushing if a threshold is reached
+    def add(self, isbn, qty):
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending[isbn] = self.pending.get(isbn, 0) + qty
+        if (len(self.pending) >= self.max_pending
+                or time.monotonic() - self.pending_since >= self.max_age):
+            return self.flush()
+        return True
+
+    # The cart as (userid, isbn, qty) rows like the cart table, stored
+    # quantities merged with the pending ones
+    def rows(self):
+        if self.stored is None:
+            self.stored = OrderedDict(self.db.execute_with_fetchall(
+                """SELECT isbn, qty
+                FROM cart
+                WHERE userid = %s;""", (self.member[0],)))
+        items = OrderedDict(self.stored)
+        for isbn, qty in self.pending.items():
+            items[isbn] = items.get(isbn, 0) + qty
+        return [(self.member[0], isbn, qty) for isbn, qty in items.items()]
+
+    # Write the pending quantities in one statement. They are added to
+    # what is stored, so two sessions of the same member never overwrite
+    # each other. Returns False (and keeps them pending) on failure.
+    def flush(self):
+        if not self.pending:
+            return True
+        try:
+            self.db.upsert_many_with_commit(
+                "cart", CART_COLUMNS, ("userid", "isbn"),
+                [(self.member[0], isbn, qty)
+                 for isbn, qty in self.pending.items()], add=("qty",))
+        except Exception as e:
+            self.io.write(f"Could not save the cart: {e}")
+            return False
+        if self.stored is not None:
+            for isbn, qty in self.pending.items():
+                self.stored[isbn] = self.stored.get(isbn, 0) + qty
+        self.pending.clear()
+        self.pending_since = None
+        return True
+
+    # Forget everything after the stored cart was emptied, e.g. by an order
+    def clear(self):
+        self.stored = OrderedDict()
+        self.pending.clear()
+        self.pending_since = None
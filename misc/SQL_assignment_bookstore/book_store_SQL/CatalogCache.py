@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from SearchIndex import SearchIndex
+
+
+# The catalog_version row that CatalogLoader bumps after a bulk load
+CATALOG_VERSION_QUERY = """SELECT version
+                FROM catalog_version
+                WHERE id = 1;"""
+
+
+class LRUCache:
+
+    # Size-bounded cache where every entry also expires after ttl seconds
+    def __init__(self, max_size, ttl) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Return the cached value, or None on a miss or an expired entry
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if time.monotonic() >= expires:
+                del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # Store a value, evicting the least recently used entry when full
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class CatalogCache:
+
+    # Cache of catalog reads: the subject list, the whole catalog, the book
+    # pages per subject, an ISBN -> book map and the author/title search
+    # index. Bulk loads from other processes are noticed through the
+    # catalog_version row, which is read at most every
+    # version_check_interval seconds.
+    def __init__(self, ttl=300, max_pages=256, max_books=10000,
+                 version_check_interval=5) -> None:
+        self.subjects = LRUCache(1, ttl)
+        self.all_books = LRUCache(1, ttl)
+        self.subject_books = LRUCache(max_pages, ttl)
+        self.books = LRUCache(max_books, ttl)
+        self.search_index = SearchIndex()
+        self.version_check_interval = version_check_interval
+        self.version = None
+        self.next_version_check = 0
+        self.version_lock = threading.Lock()
+
+    # Drop everything if the catalog version changed since the last check,
+    # i.e. another process bulk loaded books
+    def check_version(self, db):
+        now = time.monotonic()
+        with self.version_lock:
+            if now < self.next_version_check:
+                return
+            self.next_version_check = now + self.version_check_interval
+        rows = db.execute_with_fetchall(CATALOG_VERSION_QUERY)
+        version = rows[0][0] if rows else 0
+        with self.version_lock:
+            changed = self.version is not None and version != self.version
+            self.version = version
+        if changed:
+            self.invalidate_all()
+
+    # Get a value from one of the cache regions, running loader on a miss
+    def get_or_load(self, region: LRUCache, key, loader):
+        value = region.get(key)
+        if value is None:
+            value = loader()
+            region.put(key, value)
+        return value
+
+    # Cache individual books so later ISBN lookups are served from memory
+    def remember_books(self, books):
+        for book in books:
+            self.books.put(book[0], book)
+
+    # Invalidation hook for a single book being added, changed or removed.
+    # Any cached page of its subject may shift, so all pages are dropped.
+    def invalidate_book(self, isbn):
+        self.books.pop(isbn)
+        self.subjects.clear()
+        self.all_books.clear()
+        self.subject_books.clear()
+        self.search_index.mark_stale(isbn)
+
+    # Invalidation hook for bulk catalog writes
+    def invalidate_all(self):
+        self.subjects.clear()
+        self.all_books.clear()
+        self.subject_books.clear()
+        self.books.clear()
+        self.search_index.clear()
@@ -0,0 +1,251 @@
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from getpass import getpass
+from BookstoreAdmin import BookstoreAdmin
+
+
+BOOK_COLUMNS = ("isbn", "author", "title", "price", "subject")
+DEFAULT_BATCH_SIZE = 1000
+
+INSERT_HEAD = re.compile(r"INSERT\s+(?:IGNORE\s+)?INTO\s+`?books`?\s*"
+                         r"(?:\(([^)]*)\))?\s*VALUES", re.I)
+SQL_TOKEN = re.compile(r"""\s*(?:
+    '((?:[^'\\]|\\.|'')*)'          # quoted string
+    |(NULL)\b                          # NULL
+    |([-+]?[\d.]+(?:[eE][-+]?\d+)?)    # number
+    |([(),;])                          # punctuation
+)""", re.X | re.I)
+SQL_ESCAPES = {"0": "\0", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+
+# Split a SQL dump into statements, one at a time. A ; only ends a
+# statement outside a quoted string, so statements may span lines.
+def read_statements(f):
+    statement = []
+    quoted = escaped = False
+    for line in f:
+        start = 0
+        for i, char in enumerate(line):
+            if escaped:
+                escaped = False
+            elif char == "\\" and quoted:
+                escaped = True
+            elif char == "'":
+                quoted = not quoted
+            elif char == ";" and not quoted:
+                statement.append(line[start:i])
+                yield "".join(statement).strip()
+                statement = []
+                start = i + 1
+        statement.append(line[start:])
+    if "".join(statement).strip():
+        yield "".join(statement).strip()
+
+
+def unescape_sql(text):
+    text = text.replace("''", "'")
+    return re.sub(r"\\(.)", lambda m: SQL_ESCAPES.get(m.group(1), m.group(1)),
+                  text)
+
+
+# Value tuples of one INSERT INTO books statement, as dicts keyed by column
+def parse_insert(statement):
+    head = INSERT_HEAD.match(statement)
+    if head is None:
+        return
+    if head.group(1):
+        columns = [c.strip(" `") for c in head.group(1).split(",")]
+    else:
+        columns = BOOK_COLUMNS
+    position = head.end()
+    row = None
+    while position < len(statement):
+        token = SQL_TOKEN.match(statement, position)
+        if token is None:
+            raise ValueError(f"Cannot parse near: "
+                             f"{statement[position:position + 40]!r}")
+        position = token.end()
+        text, null, number, punctuation = token.groups()
+        if punctuation == "(":
+            row = []
+        elif punctuation == ")":
+            yield dict(zip(columns, row))
+            row = None
+        elif punctuation is None:
+            if row is None:
+                raise ValueError("Value outside of a row")
+            if text is not None:
+                row.append(unescape_sql(text))
+            elif null is not None:
+                row.append(None)
+            else:
+                row.append(number)
+
+
+def read_sql(f):
+    for statement in read_statements(f):
+        yield from parse_insert(statement)
+
+
+# CSV with or without a header row, separated by , or ;
+def read_csv(f):
+    sample = f.read(4096)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(f, dialect)
+    first = next(reader, None)
+    if first is None:
+        return
+    if "isbn" in (field.strip().lower() for field in first):
+        columns = [field.strip().lower() for field in first]
+    else:
+        columns = BOOK_COLUMNS
+        yield dict(zip(columns, first))
+    for fields in reader:
+        if fields:
+            yield dict(zip(columns, fields))
+
+
+def read_json_lines(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {".sql": read_sql, ".csv": read_csv, ".jsonl": read_json_lines,
+           ".json": read_json_lines, ".ndjson": read_json_lines}
+
+
+# Turn a parsed record into a books row, raises ValueError if it is invalid
+def book_row(record):
+    try:
+        isbn = str(record["isbn"]).strip()
+        row = (isbn, str(record["author"]), str(record["title"]),
+               float(record["price"]), str(record["subject"]))
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Missing column {e} in {record}")
+    if not 0 < len(isbn) <= 10:
+        raise ValueError(f"Invalid isbn {isbn!r}")
+    return row
+
+
+class CatalogLoader:
+
+    # Bulk load books into the catalog. Rows are streamed from the file and
+    # upserted on isbn in batches, so memory use does not grow with the
+    # size of the catalog and one round trip carries a whole batch. Once a
+    # load finishes the catalog_version row is bumped, which makes the
+    # CatalogCache of every running server start over, and the listeners
+    # are called, e.g. to invalidate a cache in this process.
+    def __init__(self, db, batch_size=DEFAULT_BATCH_SIZE,
+                 listeners=None) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.listeners = list(listeners) if listeners is not None else []
+        self.rejected = 0
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    # Load a catalog file, the format is taken from the file extension
+    # unless given. Returns the number of rows loaded.
+    def load_file(self, path, file_format=None):
+        if file_format is None:
+            file_format = os.path.splitext(path)[1].lower()
+        reader = READERS.get("." + file_format.lstrip("."))
+        if reader is None:
+            raise ValueError(f"Unknown catalog format {file_format!r}")
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return self.load_records(reader(f))
+
+    def load_records(self, records):
+        return self.load_rows(self._valid_rows(records))
+
+    # Upsert an iterable of (isbn, author, title, price, subject) rows
+    def load_rows(self, rows):
+        loaded = 0
+        batch = []
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) == self.batch_size:
+                    loaded += self._flush(batch)
+                    batch = []
+            if batch:
+                loaded += self._flush(batch)
+        finally:
+            # Even a partial load changes the catalog
+            if loaded:
+                self.bump_catalog_version()
+                for listener in self.listeners:
+                    listener()
+        return loaded
+
+    def bump_catalog_version(self):
+        self.db.execute_with_commit(
+            self.db.upsert_query("catalog_version", ("id", "version"), "id",
+                                 add=("version",)), (1, 1))
+
+    def _flush(self, batch):
+        self.db.upsert_many_with_commit("books", BOOK_COLUMNS, "isbn", batch)
+        return len(batch)
+
+    def _valid_rows(self, records):
+        for record in records:
+            try:
+                yield book_row(record)
+            except ValueError as e:
+                self.rejected += 1
+                if self.rejected <= 10:
+                    print(f"Skipping row: {e}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Bulk load a book catalog (SQL dump, CSV or JSON lines)")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["sql", "csv", "jsonl"],
+                        help="file format (default: from the extension)")
+    parser.add_argument("--batch-size", type=int,
+                        default=DEFAULT_BATCH_SIZE,
+                        help="rows sent per multi-row statement")
+    parser.add_argument("--sqlite-path",
+                        help="load into this SQLite file instead of MySQL")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.sqlite_path:
+        from SQLiteDatabase import SQLiteDatabase
+        db = SQLiteDatabase(args.sqlite_path)
+        db.create_schema()
+    else:
+        sql_username = input("Please provide SQL username: ")
+        sql_password = getpass("Enter SQL server password: ")
+        db = BookstoreAdmin().database_login(sql_username, sql_password, 1)
+        if db is None:
+            print("Login attempt failed. Exiting loader.")
+            exit()
+
+    loader = CatalogLoader(db, args.batch_size)
+    loader.add_listener(lambda: print(
+        "Catalog version bumped: running servers drop their cached books "
+        "and search index within seconds."))
+    start = time.perf_counter()
+    loaded = loader.load_file(args.path, args.format)
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {loaded} books in {elapsed:.2f}s "
+          f"({loader.rejected} rows skipped)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
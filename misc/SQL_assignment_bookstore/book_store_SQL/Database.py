@@ -1,28 +1,244 @@
-from mysql.connector import connect, Error
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
+from mysql.connector import connect, errorcode, Error
+from QueryInstrumentation import QueryRecord
+
+
+# Error codes that mean the server connection was dropped underneath us
+CONNECTION_LOST_ERRORS = (errorcode.CR_SERVER_GONE_ERROR,
+                          errorcode.CR_SERVER_LOST,
+                          errorcode.CR_SERVER_LOST_EXTENDED)
+
+
+class PooledConnection:
+
+    # Wrap a connection together with its cache of prepared statements.
+    # hooks is the Database's list of instrumentation hooks.
+    def __init__(self, connection, max_statements, hooks=()) -> None:
+        self.connection = connection
+        self.max_statements = max_statements
+        self.hooks = hooks
+        self.statements = OrderedDict()
+        self.last_used = time.monotonic()
+
+    # Get a prepared cursor for the query shape, preparing it on first use.
+    # The cursor only skips re-preparing when it is handed the very same
+    # string object again, so the cached key is returned along with it.
+    def prepared_cursor(self, query):
+        cached = self.statements.get(query)
+        if cached is not None:
+            self.statements.move_to_end(query)
+            return cached
+
+        cursor = self.connection.cursor(prepared=True)
+        self.statements[query] = (cursor, query)
+        if len(self.statements) > self.max_statements:
+            _, (oldest_cursor, _) = self.statements.popitem(last=False)
+            oldest_cursor.close()
+        return cursor, query
+
+    # Execute a query through its prepared statement
+    def execute(self, query, params=()):
+        start = time.perf_counter()
+        cursor, query = self.prepared_cursor(query)
+        cursor.execute(query, tuple(params))
+        self.record(query, params, start, cursor.rowcount)
+        return cursor
+
+    # Execute and fetch all results
+    def fetchall(self, query, params=()):
+        start = time.perf_counter()
+        cursor, query = self.prepared_cursor(query)
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall() if cursor.with_rows else []
+        self.record(query, params, start, len(rows), rows)
+        return rows
+
+    # Execute one statement for many rows. A plain INSERT ... VALUES is
+    # sent as a single multi-row INSERT by the driver.
+    def execute_many(self, query, rows):
+        start = time.perf_counter()
+        with self.connection.cursor() as cursor:
+            cursor.executemany(query, rows)
+        self.record(query, rows, start, len(rows))
+
+    # Pass timing and size of a finished statement to every hook
+    def record(self, query, params, start, rows, result=()):
+        if not self.hooks:
+            return
+        record = QueryRecord(query, params, time.perf_counter() - start,
+                             max(rows, 0), result)
+        for hook in self.hooks:
+            hook(record)
+
+    # Make sure the connection is still alive, reconnect if it was dropped
+    def check_health(self):
+        if not self.connection.is_connected():
+            self.reconnect()
+
+    # Reconnect after a drop. Prepared statements die with the old session.
+    def reconnect(self):
+        self.statements.clear()
+        self.connection.reconnect(attempts=3, delay=1)
 
 
 class Database:
 
-    # Establish connection to MySQL database
-    def __init__(self, username, password) -> None:
+    # Establish a bounded pool of connections to the MySQL database.
+    # The first connection is opened right away so bad credentials fail here.
+    def __init__(self, username, password, pool_size=5, host="localhost",
+                 database="book_store", acquire_timeout=10,
+                 health_check_interval=30, max_statements=64,
+                 hooks=None) -> None:
+        self.connection_args = {"host": host, "user": username,
+                                "password": password, "database": database,
+                                "autocommit": True}
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.max_statements = max_statements
+        self.hooks = list(hooks) if hooks is not None else []
+        self._idle = Queue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._release(self._open_connection())
+
+    # Open a new connection if the pool has room, otherwise return None
+    def _open_connection(self):
+        with self._lock:
+            if self._opened >= self.pool_size:
+                return None
+            self._opened += 1
+        try:
+            connection = connect(**self.connection_args)
+        except Error:
+            with self._lock:
+                self._opened -= 1
+            raise
+        return PooledConnection(connection, self.max_statements, self.hooks)
+
+    # Take an idle connection, open a new one if the pool has room,
+    # otherwise wait for another session to hand one back
+    def _acquire(self):
         try:
-            self.connection = connect(host="localhost", user="root",
-                                      password=password, database="book_store")
-        except Error as e:
-            print("Error connecting to the database:", e)
+            pooled = self._idle.get_nowait()
+        except Empty:
+            pooled = self._open_connection()
+            if pooled is not None:
+                return pooled
+            try:
+                pooled = self._idle.get(timeout=self.acquire_timeout)
+            except Empty:
+                raise Error(msg="No database connection available "
+                                "in the pool") from None
 
-    # Get cursor
-    def __get_cursor__(self):
-        return self.connection.cursor()
+        if time.monotonic() - pooled.last_used > self.health_check_interval:
+            try:
+                pooled.check_health()
+            except Error:
+                self._discard(pooled)
+                raise
+        return pooled
 
-    # Execute and fetch all results
-    def execute_with_fetchall(self, query):
-        with self.__get_cursor__() as cursor:
-            cursor.execute(query)
-            return cursor.fetchall()
-
-    # Execute with commit
-    def execute_with_commit(self, query):
-        with self.__get_cursor__() as cursor:
-            cursor.execute(query)
-            self.connection.commit()
+    # Hand a connection back to the pool
+    def _release(self, pooled):
+        try:
+            if pooled.connection.in_transaction:
+                pooled.connection.rollback()
+        except Error:
+            self._discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        try:
+            self._idle.put_nowait(pooled)
+        except Full:
+            self._discard(pooled)
+
+    # Drop a broken connection so its slot can be reopened
+    def _discard(self, pooled):
+        with self._lock:
+            self._opened -= 1
+        try:
+            pooled.connection.close()
+        except Error:
+            pass
+
+    # Borrow a connection from the pool for the duration of a with-block
+    @contextmanager
+    def connection(self):
+        pooled = self._acquire()
+        try:
+            yield pooled
+        finally:
+            self._release(pooled)
+
+    # Execute and fetch all results. Reads are safe to retry once if the
+    # connection was dropped between health checks.
+    def execute_with_fetchall(self, query, params=()):
+        with self.connection() as pooled:
+            try:
+                return pooled.fetchall(query, params)
+            except Error as e:
+                if e.errno not in CONNECTION_LOST_ERRORS:
+                    raise
+                pooled.reconnect()
+                return pooled.fetchall(query, params)
+
+    # Execute with commit, returns the id generated by an INSERT (if any).
+    # Connections run in autocommit mode, so the statement commits itself.
+    def execute_with_commit(self, query, params=()):
+        with self.connection() as pooled:
+            return pooled.execute(query, params).lastrowid
+
+    def execute_many_with_commit(self, query, rows):
+        with self.connection() as pooled:
+            pooled.execute_many(query, rows)
+
+    # INSERT that updates the other columns of rows whose key already
+    # exists. key is a column or a tuple of columns, columns in add are
+    # added to the stored value instead of replacing it.
+    def upsert_query(self, table, columns, key, add=()):
+        keys = (key,) if isinstance(key, str) else tuple(key)
+        updates = ", ".join(
+            f"{column} = {column} + VALUES({column})" if column in add
+            else f"{column} = VALUES({column})"
+            for column in columns if column not in keys)
+        return f"""INSERT INTO {table} ({", ".join(columns)})
+            VALUES ({", ".join(["%s"] * len(columns))})
+            ON DUPLICATE KEY UPDATE {updates}"""
+
+    # Upsert many rows, the driver sends every batch as one multi-row
+    # statement
+    def upsert_many_with_commit(self, table, columns, key, rows, add=()):
+        self.execute_many_with_commit(
+            self.upsert_query(table, columns, key, add), rows)
+
+    # Register an instrumentation hook, called with a QueryRecord after
+    # every statement
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    # Run several statements on one connection and commit them together.
+    # Anything raised inside the block rolls the whole transaction back.
+    @contextmanager
+    def transaction(self):
+        with self.connection() as pooled:
+            pooled.connection.start_transaction()
+            try:
+                yield pooled
+            except BaseException:
+                pooled.connection.rollback()
+                raise
+            pooled.connection.commit()
+
+    # Close every idle connection in the pool
+    def close(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except Empty:
+                return
+            self._discard(pooled)
@@ -0,0 +1,174 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("bookstore.queries")
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5)
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+# Normalize a query so every execution of the same shape gets the same
+# fingerprint: literals and placeholders become ?, IN lists of any length
+# become (...), whitespace collapses and the trailing ; is dropped
+def fingerprint(query):
+    query = STRING_LITERAL.sub("?", query)
+    query = NUMBER_LITERAL.sub("?", query)
+    query = query.replace("%s", "?")
+    query = PLACEHOLDER_LIST.sub("(...)", query)
+    query = WHITESPACE.sub(" ", query).strip().rstrip(";").strip()
+    return query
+
+
+# Rough number of bytes a result or parameter set takes on the wire
+def estimate_bytes(values):
+    total = 0
+    for value in values:
+        if isinstance(value, (tuple, list)):
+            total += estimate_bytes(value)
+        elif isinstance(value, (str, bytes, bytearray)):
+            total += len(value)
+        elif value is not None:
+            total += 8
+    return total
+
+
+class QueryRecord:
+
+    # What the instrumentation hooks get for every executed statement
+    def __init__(self, query, params, seconds, rows, result=()) -> None:
+        self.timestamp = time.time()
+        self.query = query
+        self.fingerprint = fingerprint(query)
+        self.seconds = seconds
+        self.rows = rows
+        self.bytes = estimate_bytes(params) + estimate_bytes(result)
+        self.thread = threading.current_thread().name
+        self.action = None
+
+    def as_dict(self):
+        return {"timestamp": self.timestamp, "fingerprint": self.fingerprint,
+                "seconds": self.seconds, "rows": self.rows,
+                "bytes": self.bytes, "thread": self.thread,
+                "action": self.action}
+
+
+class QueryInstrumentation:
+
+    # Instrumentation hook for Database. It aggregates timing, rows and
+    # bytes per fingerprint, logs slow queries and flags N+1 patterns: the
+    # same fingerprint repeating inside one user action.
+    def __init__(self, slow_query_seconds=0.1, slow_query_log=None,
+                 n_plus_one_threshold=3, max_records=100000) -> None:
+        self.slow_query_seconds = slow_query_seconds
+        self.slow_query_log = slow_query_log
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.records = deque(maxlen=max_records)
+        self.slow_queries = deque(maxlen=1000)
+        self.n_plus_one = []
+        self.calls = Counter()
+        self.seconds = defaultdict(float)
+        self.rows = Counter()
+        self.bytes = Counter()
+        self.buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+
+    # Mark a user action, e.g. one menu screen. Yields a Counter of the
+    # fingerprints run by this thread while the action is active.
+    @contextmanager
+    def action(self, name):
+        outer = getattr(self.local, "action", None)
+        self.local.action = (name, Counter())
+        try:
+            yield self.local.action[1]
+        finally:
+            self.local.action = outer
+
+    # Number of statements the current thread has run so far
+    def thread_queries(self):
+        return getattr(self.local, "queries", 0)
+
+    def __call__(self, record: QueryRecord):
+        self.local.queries = self.thread_queries() + 1
+        current = getattr(self.local, "action", None)
+        if current is not None:
+            record.action, fingerprints = current
+            fingerprints[record.fingerprint] += 1
+            if fingerprints[record.fingerprint] == self.n_plus_one_threshold:
+                self._flag_n_plus_one(record)
+
+        with self.lock:
+            self.records.append(record)
+            self.calls[record.fingerprint] += 1
+            self.seconds[record.fingerprint] += record.seconds
+            self.rows[record.fingerprint] += record.rows
+            self.bytes[record.fingerprint] += record.bytes
+            buckets = self.buckets[record.fingerprint]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if record.seconds <= bound:
+                    buckets[i] += 1
+
+        if record.seconds >= self.slow_query_seconds:
+            self._log_slow_query(record)
+
+    def _flag_n_plus_one(self, record):
+        with self.lock:
+            self.n_plus_one.append({"action": record.action,
+                                    "fingerprint": record.fingerprint})
+        logger.warning("Possible N+1 in %s: %s ran %d+ times", record.action,
+                       record.fingerprint, self.n_plus_one_threshold)
+
+    def _log_slow_query(self, record):
+        with self.lock:
+            self.slow_queries.append(record)
+            if self.slow_query_log is not None:
+                with open(self.slow_query_log, "a") as f:
+                    f.write(json.dumps(record.as_dict()) + "\n")
+        logger.info("Slow query (%.1f ms): %s", record.seconds * 1000,
+                    record.fingerprint)
+
+    # Write every recorded statement as one JSON object per line
+    def export_json_lines(self, path):
+        with self.lock:
+            records = list(self.records)
+        with open(path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record.as_dict()) + "\n")
+
+    # Prometheus text exposition of the per-fingerprint aggregates. Each
+    # metric family is one contiguous block, its TYPE line followed by the
+    # samples of every query, as the format requires.
+    def prometheus_text(self):
+        seconds = ["# TYPE bookstore_query_seconds histogram"]
+        rows = ["# TYPE bookstore_query_rows_total counter"]
+        sizes = ["# TYPE bookstore_query_bytes_total counter"]
+        with self.lock:
+            for query, calls in self.calls.items():
+                label = query.replace("\\", "\\\\").replace('"', '\\"')
+                label = f'query="{label}"'
+                for bound, count in zip(LATENCY_BUCKETS, self.buckets[query]):
+                    seconds.append(f'bookstore_query_seconds_bucket{{{label},'
+                                   f'le="{bound}"}} {count}')
+                seconds.append(f'bookstore_query_seconds_bucket{{{label},'
+                               f'le="+Inf"}} {calls}')
+                seconds.append(f"bookstore_query_seconds_sum{{{label}}} "
+                               f"{self.seconds[query]}")
+                seconds.append(f"bookstore_query_seconds_count{{{label}}} "
+                               f"{calls}")
+                rows.append(f"bookstore_query_rows_total{{{label}}} "
+                            f"{self.rows[query]}")
+                sizes.append(f"bookstore_query_bytes_total{{{label}}} "
+                             f"{self.bytes[query]}")
+        return "\n".join(seconds + rows + sizes) + "\n"
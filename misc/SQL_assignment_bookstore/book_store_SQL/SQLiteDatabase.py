@@ -0,0 +1,213 @@
+import datetime
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from QueryInstrumentation import QueryRecord
+
+
+sqlite3.register_converter(
+    "DATE", lambda value: datetime.date.fromisoformat(value.decode()))
+
+# book_store_schema.sql translated to SQLite
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    userid INTEGER PRIMARY KEY AUTOINCREMENT,
+    fname VARCHAR(50) NOT NULL,
+    lname VARCHAR(50) NOT NULL,
+    address VARCHAR(50) NOT NULL,
+    city VARCHAR(30) NOT NULL,
+    zip INT NOT NULL,
+    phone VARCHAR(15),
+    email VARCHAR(40) UNIQUE NOT NULL,
+    password VARCHAR(200) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS books (
+    isbn CHAR(10) PRIMARY KEY,
+    author VARCHAR(100) NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    price FLOAT NOT NULL,
+    subject VARCHAR(100) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_title ON books (title, isbn);
+CREATE INDEX IF NOT EXISTS books_subject_title
+    ON books (subject, title, isbn);
+
+CREATE TABLE IF NOT EXISTS orders (
+    userid INT NOT NULL,
+    ono INTEGER PRIMARY KEY AUTOINCREMENT,
+    created DATE,
+    shipAddress VARCHAR(50),
+    shipCity VARCHAR(30),
+    shipZip INT,
+    FOREIGN KEY (userid) REFERENCES members(userid)
+);
+
+CREATE TABLE IF NOT EXISTS odetails (
+    ono INT,
+    isbn CHAR(10),
+    qty INT NOT NULL,
+    amount FLOAT NOT NULL,
+    PRIMARY KEY (ono, isbn),
+    FOREIGN KEY (ono) REFERENCES orders(ono),
+    FOREIGN KEY (isbn) REFERENCES books(isbn)
+);
+
+CREATE TABLE IF NOT EXISTS cart (
+    userid INT,
+    isbn CHAR(10),
+    qty INT NOT NULL,
+    FOREIGN KEY (userid) REFERENCES members(userid),
+    FOREIGN KEY (isbn) REFERENCES books(isbn),
+    PRIMARY KEY (userid, isbn)
+);
+
+CREATE TABLE IF NOT EXISTS order_totals (
+    ono INTEGER PRIMARY KEY,
+    userid INT NOT NULL,
+    created DATE,
+    items INT NOT NULL,
+    total FLOAT NOT NULL,
+    FOREIGN KEY (ono) REFERENCES orders(ono)
+);
+CREATE INDEX IF NOT EXISTS order_totals_member ON order_totals (userid, ono);
+
+CREATE TABLE IF NOT EXISTS book_sales (
+    isbn CHAR(10) PRIMARY KEY,
+    subject VARCHAR(100) NOT NULL,
+    qty INT NOT NULL,
+    revenue FLOAT NOT NULL,
+    FOREIGN KEY (isbn) REFERENCES books(isbn)
+);
+CREATE INDEX IF NOT EXISTS book_sales_subject
+    ON book_sales (subject, qty, isbn);
+
+CREATE TABLE IF NOT EXISTS daily_revenue (
+    day DATE PRIMARY KEY,
+    orders INT NOT NULL,
+    items INT NOT NULL,
+    revenue FLOAT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INT PRIMARY KEY,
+    version INT NOT NULL
+);
+"""
+
+
+class SQLiteConnection:
+
+    # Same execute interface as PooledConnection, with MySQL style %s
+    # placeholders turned into SQLite's ?
+    def __init__(self, connection, hooks=()) -> None:
+        self.connection = connection
+        self.hooks = hooks
+
+    def execute(self, query, params=()):
+        start = time.perf_counter()
+        cursor = self.connection.execute(query.replace("%s", "?"),
+                                         tuple(params))
+        self.record(query, params, start, cursor.rowcount)
+        return cursor
+
+    def execute_many(self, query, rows):
+        start = time.perf_counter()
+        self.connection.executemany(query.replace("%s", "?"), rows)
+        self.record(query, rows, start, len(rows))
+
+    def fetchall(self, query, params=()):
+        start = time.perf_counter()
+        rows = self.connection.execute(query.replace("%s", "?"),
+                                       tuple(params)).fetchall()
+        self.record(query, params, start, len(rows), rows)
+        return rows
+
+    def record(self, query, params, start, rows, result=()):
+        if not self.hooks:
+            return
+        record = QueryRecord(query, params, time.perf_counter() - start,
+                             max(rows, 0), result)
+        for hook in self.hooks:
+            hook(record)
+
+
+class SQLiteDatabase:
+
+    # SQLite stand-in with the same interface as Database, so the bookstore
+    # code can be benchmarked without a MySQL server. Every thread gets its
+    # own connection to the same database file.
+    def __init__(self, path, hooks=None) -> None:
+        self.path = path
+        self.hooks = list(hooks) if hooks is not None else []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return SQLiteConnection(connection, self.hooks)
+
+    def create_schema(self):
+        self._get_connection().connection.executescript(SCHEMA)
+
+    @contextmanager
+    def connection(self):
+        yield self._get_connection()
+
+    def execute_with_fetchall(self, query, params=()):
+        return self._get_connection().fetchall(query, params)
+
+    # Connections run in autocommit mode like the MySQL pool
+    def execute_with_commit(self, query, params=()):
+        return self._get_connection().execute(query, params).lastrowid
+
+    def execute_many_with_commit(self, query, rows):
+        with self.transaction() as connection:
+            connection.execute_many(query, rows)
+
+    # Same as Database.upsert_query in SQLite's upsert syntax
+    def upsert_query(self, table, columns, key, add=()):
+        keys = (key,) if isinstance(key, str) else tuple(key)
+        updates = ", ".join(
+            f"{column} = {table}.{column} + excluded.{column}"
+            if column in add else f"{column} = excluded.{column}"
+            for column in columns if column not in keys)
+        return f"""INSERT INTO {table} ({", ".join(columns)})
+            VALUES ({", ".join(["%s"] * len(columns))})
+            ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}"""
+
+    def upsert_many_with_commit(self, table, columns, key, rows, add=()):
+        self.execute_many_with_commit(
+            self.upsert_query(table, columns, key, add), rows)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def transaction(self):
+        connection = self._get_connection()
+        connection.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.connection.execute("ROLLBACK")
+            raise
+        connection.connection.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
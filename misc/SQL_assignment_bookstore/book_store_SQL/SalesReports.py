@@ -0,0 +1,209 @@
+import argparse
+import datetime
+from collections import defaultdict
+from getpass import getpass
+from Database import Database
+from SessionIO import ConsoleIO
+
+
+class SalesReports:
+
+    # Order history and sales reports, served from summary tables that
+    # place_order updates in its own transaction: order_totals (one row
+    # per order), book_sales (per book) and daily_revenue (per day). Every
+    # report is an index range scan whose size does not depend on the
+    # total number of orders.
+    def __init__(self, io=None) -> None:
+        self.io = io if io is not None else ConsoleIO()
+
+    # Add one order to the summary tables. lines are the order's
+    # (isbn, qty, amount, subject) rows and connection is the open
+    # transaction of the order itself.
+    def record_order(self, db: Database, connection, order_number, userid,
+                     created, lines):
+        items = sum(line[1] for line in lines)
+        total = sum(line[2] for line in lines)
+        connection.execute(
+            db.upsert_query("order_totals",
+                            ("ono", "userid", "created", "items", "total"),
+                            "ono"),
+            (order_number, userid, created, items, total))
+        connection.execute(
+            db.upsert_query("daily_revenue",
+                            ("day", "orders", "items", "revenue"), "day",
+                            add=("orders", "items", "revenue")),
+            (created, 1, items, total))
+        sales = defaultdict(lambda: [None, 0, 0.0])
+        for isbn, qty, amount, subject in lines:
+            sale = sales[isbn]
+            sale[0] = subject
+            sale[1] += qty
+            sale[2] += amount
+        if sales:
+            connection.execute_many(
+                db.upsert_query("book_sales",
+                                ("isbn", "subject", "qty", "revenue"),
+                                "isbn", add=("qty", "revenue")),
+                [(isbn, *sale) for isbn, sale in sales.items()])
+
+    # One page of a member's orders, newest first. The page starts below
+    # the last order number seen, like the book pages.
+    def get_order_history_page(self, db: Database, member, before,
+                               page_size):
+        if before is None:
+            query = """SELECT ono, created, items, total
+                    FROM order_totals
+                    WHERE userid = %s
+                    ORDER BY ono DESC
+                    LIMIT %s"""
+            params = (member[0], page_size)
+        else:
+            query = """SELECT ono, created, items, total
+                    FROM order_totals
+                    WHERE userid = %s AND ono < %s
+                    ORDER BY ono DESC
+                    LIMIT %s"""
+            params = (member[0], before, page_size)
+        return db.execute_with_fetchall(query, params)
+
+    # Generator that streams a member's orders one page at a time
+    def stream_order_history(self, db: Database, member, page_size):
+        before = None
+        while True:
+            page = self.get_order_history_page(db, member, before,
+                                               page_size)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            before = page[-1][0]
+
+    # Number of orders and amount spent by a member
+    def get_member_totals(self, db: Database, member):
+        query = """SELECT COUNT(*), COALESCE(SUM(total), 0)
+                FROM order_totals
+                WHERE userid = %s;"""
+        return db.execute_with_fetchall(query, (member[0],))[0]
+
+    # Best selling books of a subject by copies sold
+    def get_best_sellers(self, db: Database, subject, limit=10):
+        query = """SELECT s.isbn, b.title, s.qty, s.revenue
+                FROM book_sales s
+                JOIN books b ON b.isbn = s.isbn
+                WHERE s.subject = %s
+                ORDER BY s.qty DESC, s.isbn DESC
+                LIMIT %s;"""
+        return db.execute_with_fetchall(query, (subject, limit))
+
+    # Orders, books sold and revenue per day, start and end included
+    def get_revenue_per_day(self, db: Database, start, end):
+        query = """SELECT day, orders, items, revenue
+                FROM daily_revenue
+                WHERE day BETWEEN %s AND %s
+                ORDER BY day;"""
+        return db.execute_with_fetchall(query, (start, end))
+
+    def print_order_history(self, orders):
+        self.io.write(f"Order{' ' * 5}Date{' ' * 10}Books{' ' * 5}Total")
+        self.io.write(f"{'_' * 40}")
+        for order_number, created, items, total in orders:
+            self.io.write(f"{order_number:<10}{str(created):<14}"
+                          f"{items:<10}{total:.2f}")
+
+    def print_member_totals(self, totals):
+        self.io.write(f"{'_' * 40}")
+        self.io.write(f"{totals[0]} orders, ${totals[1]:.2f} in total\n")
+
+    def print_best_sellers(self, subject, books):
+        self.io.write(f"\nBest sellers in {subject}\n")
+        self.io.write(f"ISBN{' ' * 10}TITLE{' ' * 40}Sold{' ' * 6}Revenue")
+        self.io.write(f"{'_' * 85}")
+        for isbn, title, qty, revenue in books:
+            self.io.write(f"{isbn:<13} {title[:40].ljust(40)}     "
+                          f"{qty:<9} {revenue:>8.2f}")
+
+    def print_revenue_per_day(self, days):
+        self.io.write(f"Date{' ' * 10}Orders{' ' * 4}Books{' ' * 5}Revenue")
+        self.io.write(f"{'_' * 45}")
+        for day, orders, items, revenue in days:
+            self.io.write(f"{str(day):<14}{orders:<10}{items:<10}"
+                          f"{revenue:.2f}")
+
+    # Recompute every summary table from orders and odetails, for orders
+    # placed before the summary tables existed. The only full scan.
+    def rebuild(self, db: Database):
+        with db.transaction() as connection:
+            for table in ("order_totals", "book_sales", "daily_revenue"):
+                connection.execute(f"DELETE FROM {table};")
+            connection.execute(
+                """INSERT INTO order_totals (ono, userid, created, items,
+                                          total)
+                SELECT o.ono, o.userid, o.created, SUM(d.qty),
+                       SUM(d.amount)
+                FROM orders o
+                JOIN odetails d ON d.ono = o.ono
+                GROUP BY o.ono, o.userid, o.created;""")
+            connection.execute(
+                """INSERT INTO book_sales (isbn, subject, qty, revenue)
+                SELECT d.isbn, b.subject, SUM(d.qty), SUM(d.amount)
+                FROM odetails d
+                JOIN books b ON b.isbn = d.isbn
+                GROUP BY d.isbn, b.subject;""")
+            connection.execute(
+                """INSERT INTO daily_revenue (day, orders, items, revenue)
+                SELECT created, COUNT(*), SUM(items), SUM(total)
+                FROM order_totals
+                GROUP BY created;""")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Sales reports from the book store summary tables")
+    parser.add_argument("report",
+                        choices=["best-sellers", "revenue", "rebuild"])
+    parser.add_argument("--subject", help="subject for best-sellers")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--start", type=datetime.date.fromisoformat,
+                        help="first day for revenue (default: 30 days ago)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat,
+                        help="last day for revenue (default: today)")
+    parser.add_argument("--sqlite-path",
+                        help="read this SQLite file instead of MySQL")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.sqlite_path:
+        from SQLiteDatabase import SQLiteDatabase
+        db = SQLiteDatabase(args.sqlite_path)
+        db.create_schema()
+    else:
+        from BookstoreAdmin import BookstoreAdmin
+        sql_username = input("Please provide SQL username: ")
+        sql_password = getpass("Enter SQL server password: ")
+        db = BookstoreAdmin().database_login(sql_username, sql_password, 1)
+        if db is None:
+            print("Login attempt failed. Exiting reports.")
+            exit()
+
+    reports = SalesReports()
+    if args.report == "rebuild":
+        reports.rebuild(db)
+        print("Summary tables rebuilt.")
+    elif args.report == "best-sellers":
+        if args.subject is None:
+            exit("best-sellers needs --subject")
+        reports.print_best_sellers(
+            args.subject, reports.get_best_sellers(db, args.subject,
+                                                   args.limit))
+    else:
+        end = args.end or datetime.date.today()
+        start = args.start or end - datetime.timedelta(days=30)
+        reports.print_revenue_per_day(
+            reports.get_revenue_per_day(db, start, end))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Column positions of the searchable fields in a books row
+SEARCH_FIELDS = {"author": 1, "title": 2}
+
+# Exact token matches rank above matches on a longer word with that prefix
+PREFIX_MATCH_WEIGHT = 0.5
+
+# Shorter words only match exactly, a one letter prefix matches most books
+MIN_PREFIX_LENGTH = 2
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+
+    # In-process inverted index over author and title tokens
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.clear()
+
+    # Forget everything, the next search rebuilds the index from the database
+    def clear(self):
+        with self.lock:
+            self.built = False
+            self.stale = set()
+            # field -> token -> {isbn: term frequency}
+            self.postings = {field: {} for field in SEARCH_FIELDS}
+            # field -> sorted tokens, for prefix matching with bisect
+            self.tokens = {field: [] for field in SEARCH_FIELDS}
+            # isbn -> (title, {field: tokens}) for ranking and removal
+            self.documents = {}
+
+    # Build the index from (isbn, author, title, ...) rows
+    def build(self, books):
+        unique_books = {book[0]: book for book in books}
+        self.clear()
+        with self.lock:
+            for book in unique_books.values():
+                self._add(book, keep_sorted=False)
+            for field, postings in self.postings.items():
+                self.tokens[field] = sorted(postings)
+            self.built = True
+
+    # Mark a book as changed, it is re-read before the next search
+    def mark_stale(self, isbn):
+        with self.lock:
+            self.stale.add(isbn)
+
+    # Swap the stale entries for freshly read rows
+    def refresh(self, isbns, books):
+        with self.lock:
+            for isbn in isbns:
+                self._remove(isbn)
+                self.stale.discard(isbn)
+            for book in books:
+                self._add(book)
+
+    def _add(self, book, keep_sorted=True):
+        isbn = book[0]
+        if isbn in self.documents:
+            self._remove(isbn)
+        fields = {}
+        for field, column in SEARCH_FIELDS.items():
+            tokens = tokenize(book[column])
+            fields[field] = tokens
+            postings = self.postings[field]
+            for token in tokens:
+                documents = postings.get(token)
+                if documents is None:
+                    documents = postings[token] = {}
+                    if keep_sorted:
+                        insort(self.tokens[field], token)
+                documents[isbn] = documents.get(isbn, 0) + 1
+        self.documents[isbn] = (book[2], fields)
+
+    def _remove(self, isbn):
+        document = self.documents.pop(isbn, None)
+        if document is None:
+            return
+        for field, tokens in document[1].items():
+            postings = self.postings[field]
+            for token in set(tokens):
+                documents = postings[token]
+                documents.pop(isbn, None)
+                if not documents:
+                    del postings[token]
+                    sorted_tokens = self.tokens[field]
+                    del sorted_tokens[bisect_left(sorted_tokens, token)]
+
+    # Index tokens that start with the given prefix
+    def _prefix_matches(self, field, prefix):
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            if prefix in self.postings[field]:
+                yield prefix
+            return
+        sorted_tokens = self.tokens[field]
+        i = bisect_left(sorted_tokens, prefix)
+        while i < len(sorted_tokens) and sorted_tokens[i].startswith(prefix):
+            yield sorted_tokens[i]
+            i += 1
+
+    # Score every book matching one query token in the given fields
+    def _score_term(self, term, fields):
+        scores = {}
+        total = len(self.documents)
+        for field in fields:
+            postings = self.postings[field]
+            for token in self._prefix_matches(field, term):
+                documents = postings[token]
+                weight = math.log(1 + total / len(documents))
+                if token != term:
+                    weight *= PREFIX_MATCH_WEIGHT
+                for isbn, frequency in documents.items():
+                    score = weight * frequency
+                    if score > scores.get(isbn, 0):
+                        scores[isbn] = score
+        return scores
+
+    # Return ISBNs of books matching every word in text, best match first.
+    # Each word also matches longer words it is a prefix of.
+    def search(self, text, fields=tuple(SEARCH_FIELDS)):
+        terms = list(dict.fromkeys(tokenize(text)))
+        if not terms:
+            return []
+
+        with self.lock:
+            term_scores = [self._score_term(term, fields) for term in terms]
+            term_scores.sort(key=len)
+            totals = dict(term_scores[0])
+            for scores in term_scores[1:]:
+                totals = {isbn: total + scores[isbn]
+                          for isbn, total in totals.items() if isbn in scores}
+            documents = self.documents
+            return sorted(totals, key=lambda isbn: (-totals[isbn],
+                                                    documents[isbn][0], isbn))
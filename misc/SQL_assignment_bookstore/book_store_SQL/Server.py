@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from Database import Database
+from CatalogCache import CatalogCache
+from Session import Session
+from SessionIO import StreamIO
+
+
+class BookstoreServer:
+
+    # Serve member sessions over TCP. The event loop owns every socket,
+    # while each session's menus and queries run in a worker thread, so one
+    # slow session never blocks the others. A session holds its worker
+    # until it ends or stays idle for idle_timeout seconds, so clients
+    # beyond max_sessions are turned away right after they connect instead
+    # of waiting for a worker without a prompt.
+    def __init__(self, db: Database, host="localhost", port=8000,
+                 max_sessions=32, idle_timeout=600, close_timeout=5,
+                 instrumentation=None) -> None:
+        self.db = db
+        self.instrumentation = instrumentation
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.close_timeout = close_timeout
+        self.active_sessions = 0
+        self.cache = CatalogCache()
+        self.executor = ThreadPoolExecutor(max_workers=max_sessions,
+                                           thread_name_prefix="session")
+
+    async def handle_client(self, reader, writer):
+        # Only the event loop thread touches the counter
+        if self.active_sessions >= self.max_sessions:
+            await self.refuse(writer)
+            return
+        self.active_sessions += 1
+        loop = asyncio.get_running_loop()
+        io = StreamIO(reader, writer, loop, self.idle_timeout)
+        session = Session(self.db, io, self.cache, self.instrumentation)
+        try:
+            await loop.run_in_executor(self.executor, session.run)
+        finally:
+            self.active_sessions -= 1
+            await self.close(writer)
+
+    # Tell an over capacity client to come back later. A client that does
+    # not read the message is dropped after close_timeout seconds.
+    async def refuse(self, writer):
+        writer.write(b"The book store is busy, all sessions are taken. "
+                     b"Please try again later.\n")
+        try:
+            await asyncio.wait_for(writer.drain(), self.close_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        await self.close(writer)
+
+    async def close(self, writer):
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), self.close_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_client, self.host,
+                                            self.port)
+        print(f"Serving the book store on {self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\nShutting down...")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.db.close()
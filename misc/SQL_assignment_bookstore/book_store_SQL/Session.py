@@ -0,0 +1,211 @@
+from contextlib import nullcontext
+from Database import Database
+from CatalogCache import CatalogCache
+from BrowseAndSearch import BrowseAndSearch
+from BookstoreAdmin import BookstoreAdmin
+from OrderAndShipping import OrderAndShipping
+from Cart import Cart
+from Menu import Menu
+from Actions import MainMenuActions, MemberMenuActions, SearchMenuActions
+
+
+class Session:
+
+    # All state of one member session. The menus form a state machine:
+    # every state handles one screen and returns the next state, so
+    # navigating never grows the call stack. With query instrumentation
+    # every state counts as one user action for the N+1 detector, and so
+    # does every further page the user asks for within a state.
+    def __init__(self, db: Database, io, cache: CatalogCache,
+                 instrumentation=None) -> None:
+        self.db = db
+        self.io = io
+        self.instrumentation = instrumentation
+        self.menu = Menu(io)
+        self.bas = BrowseAndSearch(cache, io)
+        self.admin = BookstoreAdmin(io)
+        self.oas = OrderAndShipping(io)
+        self.logged_in_user = None
+        self.cart = None
+
+    # Run states until the user quits or the connection goes away
+    def run(self):
+        state = self.start_menu
+        try:
+            while state is not None:
+                with self._action(state.__name__):
+                    state = state()
+        except EOFError:
+            pass
+        finally:
+            # Keep what a dropped session added to its cart
+            if self.cart is not None:
+                self.cart.flush()
+            self.logged_in_user = None
+            self.cart = None
+
+    def _action(self, name):
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.action(name)
+
+    # Fetch the next page of a stream as its own user action, so paging
+    # through many pages is not taken for an N+1 pattern
+    def _next_page(self, pages):
+        with self._action("next_page"):
+            return next(pages, None)
+
+    def start_menu(self):
+        user_choice = self.menu.main_menu()
+        if user_choice == MainMenuActions.MEMBER_LOGIN:
+            return self.user_log_in
+        elif user_choice == MainMenuActions.NEW_MEMBER_REGISTRATION:
+            if self.admin.create_member(self.db) is False:
+                self.io.write("Member creation failed.\n")
+            else:
+                self.io.write("\nMember Creation Successful!\n")
+            return self.start_menu
+        elif user_choice == MainMenuActions.QUIT:
+            self.io.write("Goodbye!")
+            return None
+
+    def user_log_in(self):
+        username = self.io.read("Enter email: ")
+        password = self.io.read_secret("Enter password: ")
+        log_in_attempt = self.admin.get_member(self.db, username, password)
+        if log_in_attempt is not None:
+            self.io.write(f"\nUser {username} logged in successfully\n")
+            self.logged_in_user = log_in_attempt
+            self.cart = Cart(self.db, log_in_attempt, io=self.io)
+            return self.member_menu
+        else:
+            self.io.write(f"\nLog in attempt for user {username} failed.\n")
+            return self.start_menu
+
+    def log_out(self):
+        self.io.write(f"Logging out user {self.logged_in_user[7]}...\n")
+        self.cart.flush()
+        self.logged_in_user = None
+        self.cart = None
+        return self.start_menu
+
+    def member_menu(self):
+        user_choice = self.menu.member_menu()
+        if user_choice == MemberMenuActions.BROWSE_BY_SUBJECT:
+            return self.browse_by_subject
+        elif user_choice == MemberMenuActions.SEARCH_BY_AUTHOR_TITLE:
+            return self.search_menu
+        elif user_choice == MemberMenuActions.CHECK_OUT:
+            return self.check_out
+        elif user_choice == MemberMenuActions.ORDER_HISTORY:
+            return self.order_history
+        elif user_choice == MemberMenuActions.LOGOUT:
+            return self.log_out
+
+    def browse_by_subject(self):
+        self.bas.display_subjects(self.db)
+        subjects = self.bas.get_subjects_with_key(self.db)
+        self.io.write(f"\nChoose a subject: (Enter a number between "
+                      f"1-{len(subjects)}):\n")
+        choice = self.io.read("-> ")
+        chosen_subject = self.bas.choose_subject(choice, subjects)
+        pages = self.bas.get_books_from_subject(self.db, chosen_subject, 2)
+        self.browse_books(pages)
+        return self.member_menu
+
+    def search_menu(self):
+        user_choice = self.menu.search_menu()
+        if user_choice == SearchMenuActions.AUTHOR_SEARCH:
+            pages = self.bas.search_by_author(self.db, 3)
+        elif user_choice == SearchMenuActions.TITLE_SEARCH:
+            pages = self.bas.search_by_title(self.db, 3)
+        elif user_choice == SearchMenuActions.AUTHOR_TITLE_SEARCH:
+            pages = self.bas.search_by_author_and_title(self.db, 3)
+        elif user_choice == SearchMenuActions.GO_TO_MAIN_MENU:
+            return self.member_menu
+        self.browse_books(pages)
+        return self.search_menu
+
+    def check_out(self):
+        cart = self.oas.get_cart(self.db, self.logged_in_user, self.cart)
+
+        if cart is None:
+            self.io.write("\nNo items in cart. Returning to Member Menu...\n")
+            return self.member_menu
+
+        self.oas.print_receipt(self.db, self.bas, cart)
+        proceed_question = self.io.read(
+            "\nProceed to check out (Y/N ?): \n").lower()
+        if proceed_question == "y" or proceed_question == "yes":
+            # The order is placed from the cart table
+            order_number = None
+            if self.cart.flush():
+                order_number = self.admin.place_order(self.db,
+                                                      self.logged_in_user)
+            if order_number is None:
+                self.io.write("\nCheck out failed. Returning to Member "
+                              "Menu\n")
+                return self.member_menu
+            self.cart.clear()
+            order = self.oas.get_order(self.db, order_number)
+            self.oas.print_shipping_info(self.logged_in_user, order)
+            self.oas.print_receipt(self.db, self.bas, cart)
+            self.io.write("\nThanks For Shopping!\n")
+            return self.log_out
+        elif proceed_question == "n":
+            self.io.write("\nReturning to Member Menu\n")
+        else:
+            self.io.write("\nInvalid input. Returning to Member Menu\n")
+        return self.member_menu
+
+    # Page through the member's orders, newest first
+    def order_history(self):
+        reports = self.admin.reports
+        totals = reports.get_member_totals(self.db, self.logged_in_user)
+        if totals[0] == 0:
+            self.io.write("\nNo orders yet. Returning to Member Menu...\n")
+            return self.member_menu
+        pages = reports.stream_order_history(self.db, self.logged_in_user,
+                                             10)
+        reports.print_order_history(next(pages, []))
+        reports.print_member_totals(totals)
+        while self.io.read("n for more orders or ENTER to go back: ") == "n":
+            page = self._next_page(pages)
+            if page is None:
+                self.io.write("\nNo more orders to display.\n")
+                break
+            reports.print_order_history(page)
+        return self.member_menu
+
+    # Page through a stream of books, only the current page is kept in memory
+    def browse_books(self, pages):
+        books = next(pages, [])
+        while True:
+            self.bas.display_books(books, 0, len(books))
+            self.io.write("""Enter ISBN to add to Cart or
+            n to browse or ENTER to go back to menu:""")
+            user_input = self.io.read("-> ")
+            if self.bas.isbn_match(user_input, books) is True:
+                qty = self.io.read("\nEnter quantity (1-10): ")
+                try:
+                    qty = int(qty)
+                    if not (1 <= qty <= 10):
+                        self.io.write("Please enter a quantity between 1 "
+                                      "and 10. \n")
+                except ValueError:
+                    self.io.write("Invalid input. Please enter a valid "
+                                  "integer. \n")
+                    continue
+                cart_status = self.admin.addToCart(self.db, user_input, qty,
+                                                   self.logged_in_user,
+                                                   self.cart)
+                if cart_status is True:
+                    self.io.write(f"\nAdded {qty} books to cart\n")
+            elif user_input == "n":
+                next_page = self._next_page(pages)
+                if next_page is None:
+                    self.io.write("\nNo more books to display.\n")
+                else:
+                    books = next_page
+            elif user_input == "":
+                break
@@ -0,0 +1,61 @@
+import asyncio
+from getpass import getpass
+
+
+class ConsoleIO:
+
+    # Terminal I/O for the single user application
+    def write(self, text=""):
+        print(text)
+
+    def read(self, prompt=""):
+        return input(prompt)
+
+    def read_secret(self, prompt=""):
+        return getpass(prompt)
+
+
+class StreamIO:
+
+    # Blocking I/O for a session running in a worker thread, backed by an
+    # asyncio stream pair that lives on the event loop thread. Reading
+    # raises EOFError when the client disconnects or stays idle too long.
+    def __init__(self, reader, writer, loop, idle_timeout) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+        self.idle_timeout = idle_timeout
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _write(self, text):
+        self.writer.write(text.encode())
+        await self.writer.drain()
+
+    async def _read(self, prompt):
+        await self._write(prompt)
+        try:
+            line = await asyncio.wait_for(self.reader.readline(),
+                                          self.idle_timeout)
+        except asyncio.TimeoutError:
+            raise EOFError("Session timed out") from None
+        if not line:
+            raise EOFError("Client disconnected")
+        return line.decode(errors="replace").rstrip("\r\n")
+
+    def write(self, text=""):
+        try:
+            self._run(self._write(f"{text}\n"))
+        except ConnectionError:
+            raise EOFError("Client disconnected") from None
+
+    def read(self, prompt=""):
+        try:
+            return self._run(self._read(prompt))
+        except ConnectionError:
+            raise EOFError("Client disconnected") from None
+
+    # A raw socket has no way to turn off echo on the client side
+    def read_secret(self, prompt=""):
+        return self.read(prompt)
@@ -0,0 +1,52 @@
+import unittest
+from BrowseAndSearch import BrowseAndSearch
+from CatalogCache import CatalogCache
+from SQLiteDatabase import SQLiteDatabase
+
+INSERT_BOOK = "INSERT INTO books VALUES (%s, %s, %s, %s, %s);"
+
+
+class KeysetPaginationTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.db = SQLiteDatabase(":memory:")
+        self.db.create_schema()
+        # Two books share a title, so pages must break ties on isbn
+        self.books = [(f"{i:010d}", "Author", title, 10.0 + i, "Fiction")
+                      for i, title in enumerate(["Dune", "Emma", "Beloved",
+                                                 "Emma", "Atonement",
+                                                 "Carrie", "Frankenstein"])]
+        self.db.execute_many_with_commit(INSERT_BOOK, self.books)
+        self.db.execute_with_commit(INSERT_BOOK, ("9999999999", "Other",
+                                                  "Aaa", 1.0, "History"))
+        self.bas = BrowseAndSearch(CatalogCache())
+
+    def test_pages_cover_the_subject_in_order(self):
+        pages = list(self.bas.stream_books(self.db, "Fiction", 3))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        books = [book for page in pages for book in page]
+        self.assertEqual(books, sorted(self.books,
+                                       key=lambda book: (book[2], book[0])))
+
+    def test_no_empty_page_after_a_full_one(self):
+        pages = list(self.bas.stream_books(self.db, "Fiction", 7))
+        self.assertEqual([len(page) for page in pages], [7])
+
+    # A page starts after the last (title, isbn) seen, so a book added in
+    # front of it does not shift the next page
+    def test_next_page_is_stable_under_inserts(self):
+        first = self.bas.get_books_page(self.db, "Fiction", None, 3)
+        self.db.execute_with_commit(INSERT_BOOK, ("0000000100", "Author",
+                                                  "Aardvark", 5.0, "Fiction"))
+        after = (first[-1][2], first[-1][0])
+        second = self.bas.get_books_page(self.db, "Fiction", after, 3)
+        self.assertEqual([book[2] for book in second],
+                         ["Dune", "Emma", "Emma"])
+
+    def test_unknown_subject_has_no_pages(self):
+        self.assertEqual(list(self.bas.stream_books(self.db, "Poetry", 3)),
+                         [])
+
+
+if __name__ == "__main__":
+    unittest.main()
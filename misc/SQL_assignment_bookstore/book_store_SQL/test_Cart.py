@@ -0,0 +1,92 @@
+import unittest
+from Cart import Cart
+from SQLiteDatabase import SQLiteDatabase
+
+
+class RecordingIO:
+
+    # Session I/O that only collects the output
+    def __init__(self) -> None:
+        self.output = []
+
+    def write(self, text=""):
+        self.output.append(text)
+
+
+class CartUpsertTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.db = SQLiteDatabase(":memory:")
+        self.db.create_schema()
+        self.db.execute_with_commit(
+            """INSERT INTO members (fname, lname, address, city, zip, phone,
+                                    email, password)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s);""",
+            ("Ada", "Lovelace", "1 Street", "London", 12345, "555",
+             "ada@example.com", "secret"))
+        self.member = self.db.execute_with_fetchall(
+            "SELECT * FROM members;")[0]
+        self.db.execute_many_with_commit(
+            "INSERT INTO books VALUES (%s, %s, %s, %s, %s);",
+            [(f"{i:010d}", "Author", f"Title {i}", 10.0, "Fiction")
+             for i in range(5)])
+        self.io = RecordingIO()
+
+    def stored(self):
+        return self.db.execute_with_fetchall(
+            "SELECT isbn, qty FROM cart WHERE userid = %s ORDER BY isbn;",
+            (self.member[0],))
+
+    def cart(self, **kwargs):
+        return Cart(self.db, self.member, io=self.io, **kwargs)
+
+    def test_adds_are_merged_and_written_on_flush(self):
+        cart = self.cart()
+        cart.add("0000000001", 2)
+        cart.add("0000000001", 3)
+        cart.add("0000000002", 1)
+        self.assertEqual(self.stored(), [])
+        self.assertTrue(cart.flush())
+        self.assertEqual(self.stored(), [("0000000001", 5),
+                                         ("0000000002", 1)])
+
+    # Two sessions of the same member add to the stored quantity
+    def test_flush_adds_to_the_stored_quantity(self):
+        first, second = self.cart(), self.cart()
+        first.add("0000000001", 2)
+        second.add("0000000001", 4)
+        first.flush()
+        second.flush()
+        self.assertEqual(self.stored(), [("0000000001", 6)])
+        self.assertEqual(second.rows(), [(self.member[0], "0000000001", 6)])
+
+    def test_rows_include_pending_adds(self):
+        cart = self.cart()
+        cart.add("0000000003", 1)
+        cart.flush()
+        cart.add("0000000003", 2)
+        cart.add("0000000004", 1)
+        self.assertEqual(cart.rows(), [(self.member[0], "0000000003", 3),
+                                       (self.member[0], "0000000004", 1)])
+
+    def test_max_pending_flushes(self):
+        cart = self.cart(max_pending=2)
+        cart.add("0000000001", 1)
+        self.assertEqual(self.stored(), [])
+        cart.add("0000000002", 1)
+        self.assertEqual(self.stored(), [("0000000001", 1),
+                                         ("0000000002", 1)])
+
+    # A failed write keeps the adds pending and reports through the io
+    def test_failed_flush_keeps_pending(self):
+        cart = self.cart()
+        cart.add("0000000999", 1)
+        self.assertFalse(cart.flush())
+        self.assertEqual(cart.pending, {"0000000999": 1})
+        self.assertEqual(self.stored(), [])
+        self.assertTrue(self.io.output[-1].startswith(
+            "Could not save the cart"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+from CatalogLoader import CatalogLoader
+from SQLiteDatabase import SQLiteDatabase
+
+
+class CatalogLoaderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.db = SQLiteDatabase(":memory:")
+        self.db.create_schema()
+        self.directory = tempfile.TemporaryDirectory()
+        self.calls = []
+        self.loader = CatalogLoader(self.db, batch_size=2,
+                                    listeners=[lambda: self.calls.append(1)])
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def books(self):
+        return self.db.execute_with_fetchall(
+            "SELECT * FROM books ORDER BY isbn;")
+
+    def version(self):
+        rows = self.db.execute_with_fetchall(
+            "SELECT version FROM catalog_version;")
+        return rows[0][0] if rows else 0
+
+    # Statements span lines and quoted values hold ; and escaped quotes
+    def test_sql_dump(self):
+        path = self.write("books.sql", """INSERT INTO books
+            (isbn, author, title, price, subject) VALUES
+            ('0000000001', 'O''Brien', 'War; Peace', 9.5, 'History'),
+            ('0000000002', 'Smith', 'It\\'s \\"here\\"', 12, 'Fiction');
+            INSERT INTO books VALUES
+            ('0000000003', 'Doe', 'Third', 3.25, 'Fiction');""")
+        self.assertEqual(self.loader.load_file(path), 3)
+        self.assertEqual(self.books(), [
+            ("0000000001", "O'Brien", "War; Peace", 9.5, "History"),
+            ("0000000002", "Smith", 'It\'s "here"', 12.0, "Fiction"),
+            ("0000000003", "Doe", "Third", 3.25, "Fiction")])
+
+    def test_csv_with_header_and_semicolons(self):
+        path = self.write("books.csv",
+                          "\ufeffisbn;title;author;price;subject\n"
+                          "0000000001;First;Ann;1.5;Art\n"
+                          "0000000002;Second;Bob;2;Art\n")
+        self.assertEqual(self.loader.load_file(path), 2)
+        self.assertEqual(self.books()[0],
+                         ("0000000001", "Ann", "First", 1.5, "Art"))
+
+    # Invalid records are skipped and counted
+    def test_json_lines_rejects_invalid_rows(self):
+        records = [
+            {"isbn": "0000000001", "author": "Ann", "title": "First",
+             "price": 1, "subject": "Art"},
+            {"isbn": "0000000002", "author": "Bob", "title": "No price",
+             "subject": "Art"},
+            {"isbn": "00000000031", "author": "Cy", "title": "Long isbn",
+             "price": 3, "subject": "Art"},
+        ]
+        path = self.write("books.jsonl",
+                          "\n".join(json.dumps(r) for r in records) + "\n")
+        self.assertEqual(self.loader.load_file(path), 1)
+        self.assertEqual(self.loader.rejected, 2)
+        self.assertEqual(len(self.books()), 1)
+
+    # A reload updates books in place and bumps the catalog version again
+    def test_reload_upserts_and_bumps_the_version(self):
+        row = ("0000000001", "Ann", "First", 1.0, "Art")
+        self.loader.load_rows([row])
+        self.assertEqual(self.version(), 1)
+        self.loader.load_rows([row[:3] + (4.0,) + row[4:]])
+        self.assertEqual(self.books(), [row[:3] + (4.0,) + row[4:]])
+        self.assertEqual(self.version(), 2)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_empty_load_leaves_the_version(self):
+        self.assertEqual(self.loader.load_rows([]), 0)
+        self.assertEqual(self.version(), 0)
+        self.assertEqual(self.calls, [])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.loader.load_file(self.write("books.xml", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
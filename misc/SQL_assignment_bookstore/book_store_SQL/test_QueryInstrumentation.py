@@ -0,0 +1,115 @@
+import unittest
+from CatalogCache import CatalogCache
+from QueryInstrumentation import QueryInstrumentation, QueryRecord
+from Session import Session
+from SQLiteDatabase import SQLiteDatabase
+
+try:
+    from prometheus_client.parser import text_string_to_metric_families
+except ImportError:
+    text_string_to_metric_families = None
+
+
+class PrometheusTextTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.instrumentation = QueryInstrumentation(slow_query_seconds=10)
+        queries = [
+            ("SELECT * FROM books WHERE isbn = %s;", 0.0004, 1),
+            ("SELECT * FROM books WHERE isbn = %s;", 0.02, 1),
+            ('SELECT * FROM books WHERE title = "a\\b";', 0.3, 0),
+            ("SELECT qty FROM cart WHERE userid = %s;", 0.001, 4),
+        ]
+        for query, seconds, rows in queries:
+            self.instrumentation(QueryRecord(query, ("x",), seconds, rows))
+
+    # Every family's samples directly follow its TYPE line
+    def test_families_are_contiguous(self):
+        lines = self.instrumentation.prometheus_text().splitlines()
+        families = []
+        for line in lines:
+            if line.startswith("# TYPE "):
+                families.append(line.split()[2])
+                continue
+            family = families[-1]
+            self.assertIn(line.split("{")[0],
+                          (family, f"{family}_bucket", f"{family}_sum",
+                           f"{family}_count"), line)
+        self.assertEqual(len(families), len(set(families)))
+        self.assertEqual(len(families), 3)
+
+    @unittest.skipIf(text_string_to_metric_families is None,
+                     "prometheus_client is not installed")
+    def test_parses_with_prometheus_client(self):
+        text = self.instrumentation.prometheus_text()
+        families = {family.name: family
+                    for family in text_string_to_metric_families(text)}
+        self.assertEqual(set(families),
+                         {"bookstore_query_seconds", "bookstore_query_rows",
+                          "bookstore_query_bytes"})
+        counts = {sample.labels["query"]: sample.value
+                  for sample in families["bookstore_query_seconds"].samples
+                  if sample.name == "bookstore_query_seconds_count"}
+        self.assertEqual(
+            counts["SELECT * FROM books WHERE isbn = ?"], 2)
+        self.assertEqual(
+            counts['SELECT * FROM books WHERE title = ?'], 1)
+        rows = {sample.labels["query"]: sample.value
+                for sample in families["bookstore_query_rows"].samples}
+        self.assertEqual(rows["SELECT qty FROM cart WHERE userid = ?"], 4)
+
+
+class ScriptedIO:
+
+    # Session I/O that answers prompts from a list and collects the output
+    def __init__(self, answers) -> None:
+        self.answers = list(answers)
+        self.output = []
+
+    def write(self, text=""):
+        self.output.append(text)
+
+    def read(self, prompt=""):
+        if not self.answers:
+            raise EOFError
+        return self.answers.pop(0)
+
+    read_secret = read
+
+
+class NPlusOneTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.db = SQLiteDatabase(":memory:")
+        self.db.create_schema()
+        self.db.execute_many_with_commit(
+            "INSERT INTO books VALUES (%s, %s, %s, %s, %s);",
+            [(f"{i:010d}", "Author", f"Title {i:02d}", 10.0, "Fiction")
+             for i in range(12)])
+        self.instrumentation = QueryInstrumentation(n_plus_one_threshold=3)
+        self.db.add_hook(self.instrumentation)
+
+    # Every page the user asks for is its own action, so paging through a
+    # subject is not flagged
+    def test_paging_is_not_flagged(self):
+        io = ScriptedIO(["n"] * 6 + [""])
+        session = Session(self.db, io, CatalogCache(), self.instrumentation)
+        with session._action("browse_by_subject"):
+            pages = session.bas.get_books_from_subject(self.db, "Fiction", 2)
+            session.browse_books(pages)
+        self.assertIn("\nNo more books to display.\n", io.output)
+        self.assertEqual(self.instrumentation.n_plus_one, [])
+
+    def test_repeated_query_in_one_action_is_flagged(self):
+        with self.instrumentation.action("lookup"):
+            for i in range(3):
+                self.db.execute_with_fetchall(
+                    "SELECT * FROM books WHERE isbn = %s;", (f"{i:010d}",))
+        self.assertEqual(
+            self.instrumentation.n_plus_one,
+            [{"action": "lookup",
+              "fingerprint": "SELECT * FROM books WHERE isbn = ?"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import datetime
+import unittest
+from BookstoreAdmin import BookstoreAdmin
+from SalesReports import SalesReports
+from SQLiteDatabase import SQLiteDatabase
+
+
+class RecordingIO:
+
+    # Session I/O that only collects the output
+    def __init__(self) -> None:
+        self.output = []
+
+    def write(self, text=""):
+        self.output.append(text)
+
+
+class SalesReportsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.db = SQLiteDatabase(":memory:")
+        self.db.create_schema()
+        self.db.execute_many_with_commit(
+            """INSERT INTO members (fname, lname, address, city, zip, phone,
+                                    email, password)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s);""",
+            [("Ada", "Lovelace", "1 Street", "London", 12345, "555",
+              "ada@example.com", "secret"),
+             ("Alan", "Turing", "2 Street", "Wilmslow", 54321, "556",
+              "alan@example.com", "secret")])
+        self.ada, self.alan = self.db.execute_with_fetchall(
+            "SELECT * FROM members ORDER BY userid;")
+        self.db.execute_many_with_commit(
+            "INSERT INTO books VALUES (%s, %s, %s, %s, %s);",
+            [("0000000001", "Herbert", "Dune", 10.0, "Fiction"),
+             ("0000000002", "Austen", "Emma", 4.0, "Fiction"),
+             ("0000000003", "Beard", "SPQR", 20.0, "History")])
+        self.io = RecordingIO()
+        self.admin = BookstoreAdmin(self.io)
+        self.reports = self.admin.reports
+        self.today = datetime.date.today()
+
+    def order(self, member, lines):
+        self.db.upsert_many_with_commit(
+            "cart", ("userid", "isbn", "qty"), ("userid", "isbn"),
+            [(member[0], isbn, qty) for isbn, qty in lines], add=("qty",))
+        return self.admin.place_order(self.db, member)
+
+    def summaries(self):
+        return [self.db.execute_with_fetchall(f"SELECT * FROM {table} "
+                                              f"ORDER BY 1;")
+                for table in ("order_totals", "book_sales", "daily_revenue")]
+
+    def test_order_updates_the_summary_tables(self):
+        first = self.order(self.ada, [("0000000001", 2), ("0000000003", 1)])
+        second = self.order(self.alan, [("0000000001", 1)])
+        order_totals, book_sales, daily_revenue = self.summaries()
+        self.assertEqual(order_totals,
+                         [(first, self.ada[0], self.today, 3, 40.0),
+                          (second, self.alan[0], self.today, 1, 10.0)])
+        self.assertEqual(book_sales,
+                         [("0000000001", "Fiction", 3, 30.0),
+                          ("0000000003", "History", 1, 20.0)])
+        self.assertEqual(daily_revenue, [(self.today, 2, 4, 50.0)])
+        self.assertEqual(self.db.execute_with_fetchall("SELECT * FROM cart;"),
+                         [])
+
+    def test_order_history_pages_newest_first(self):
+        orders = [self.order(self.ada, [("0000000002", 1)])
+                  for _ in range(5)]
+        self.order(self.alan, [("0000000002", 1)])
+        pages = list(self.reports.stream_order_history(self.db, self.ada, 2))
+        self.assertEqual([[row[0] for row in page] for page in pages],
+                         [orders[4:2:-1], orders[2:0:-1], orders[:1]])
+        self.assertEqual(self.reports.get_member_totals(self.db, self.ada),
+                         (5, 20.0))
+
+    def test_best_sellers_and_revenue(self):
+        self.order(self.ada, [("0000000001", 1), ("0000000002", 3)])
+        self.order(self.alan, [("0000000003", 2)])
+        self.assertEqual(
+            self.reports.get_best_sellers(self.db, "Fiction"),
+            [("0000000002", "Emma", 3, 12.0),
+             ("0000000001", "Dune", 1, 10.0)])
+        self.assertEqual(
+            self.reports.get_revenue_per_day(
+                self.db, self.today - datetime.timedelta(days=1),
+                self.today),
+            [(self.today, 2, 6, 62.0)])
+
+    # Recomputing from orders and odetails gives the same tables
+    def test_rebuild_matches_the_incremental_tables(self):
+        self.order(self.ada, [("0000000001", 2), ("0000000002", 1)])
+        self.order(self.alan, [("0000000002", 4)])
+        incremental = self.summaries()
+        SalesReports().rebuild(self.db)
+        self.assertEqual(self.summaries(), incremental)
+
+    # An order with a book that left the catalog is rolled back whole
+    def test_failed_order_leaves_no_summary(self):
+        self.db.execute_with_commit("PRAGMA foreign_keys = OFF;")
+        self.assertIsNone(self.order(self.ada, [("0000000001", 1),
+                                                ("0000000999", 1)]))
+        self.assertEqual(self.summaries(), [[], [], []])
+        self.assertEqual(len(self.db.execute_with_fetchall(
+            "SELECT * FROM cart;")), 2)
+        self.assertEqual(self.io.output,
+                         ["Could not place the order: "
+                          "No longer available: 0000000999"])
+
+
+if __name__ == "__main__":
+    unittest.main()
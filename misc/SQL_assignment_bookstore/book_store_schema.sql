@@ -17,7 +17,9 @@ CREATE TABLE books (
     author VARCHAR(100) NOT NULL,
     title VARCHAR(200) NOT NULL,
     price FLOAT NOT NULL,
-    subject VARCHAR(100) NOT NULL
+    subject VARCHAR(100) NOT NULL,
+    INDEX books_title (title, isbn),
+    INDEX books_subject_title (subject, title, isbn)
 );
 
 CREATE TABLE orders (
@@ -48,3 +50,38 @@ CREATE TABLE cart (
     FOREIGN KEY (isbn) REFERENCES books(isbn),
     PRIMARY KEY (userid, isbn)
 );
+
+-- Summary tables kept up to date by every checkout, so order history and
+-- sales reports never have to aggregate odetails
+CREATE TABLE order_totals (
+    ono INT PRIMARY KEY,
+    userid INT NOT NULL,
+    created DATE,
+    items INT NOT NULL,
+    total FLOAT NOT NULL,
+    FOREIGN KEY (ono) REFERENCES orders(ono),
+    INDEX order_totals_member (userid, ono)
+);
+
+CREATE TABLE book_sales (
+    isbn CHAR(10) PRIMARY KEY,
+    subject VARCHAR(100) NOT NULL,
+    qty INT NOT NULL,
+    revenue FLOAT NOT NULL,
+    FOREIGN KEY (isbn) REFERENCES books(isbn),
+    INDEX book_sales_subject (subject, qty, isbn)
+);
+
+CREATE TABLE daily_revenue (
+    day DATE PRIMARY KEY,
+    orders INT NOT NULL,
+    items INT NOT NULL,
+    revenue FLOAT NOT NULL
+);
+
+-- Bumped after every bulk catalog load. Running servers poll it and drop
+-- their cached catalog and search index when it changes.
+CREATE TABLE catalog_version (
+    id INT PRIMARY KEY,
+    version INT NOT NULL
+);